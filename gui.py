@@ -2,21 +2,35 @@
 
 import sys
 import os
+import io
+import csv
+import gzip
+import hashlib
+import math
+import multiprocessing
 import re
 import tempfile
+import threading
+import time
+import zipfile
 import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import product
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QTabWidget, QGroupBox, QLabel, QLineEdit, QTextEdit, QPushButton, QSpinBox,
-    QDoubleSpinBox, QCheckBox, QComboBox, QTableWidget, QTableWidgetItem,
+    QDoubleSpinBox, QCheckBox, QComboBox, QTableView,
     QAbstractItemView, QFileDialog, QMessageBox, QStatusBar, QProgressBar,
     QDialog, QDialogButtonBox, QFormLayout, QListWidget, QListWidgetItem,
     QSplitter, QFrame, QHeaderView, QAbstractScrollArea
 )
-from PySide6.QtCore import Qt, Signal, QThread
+from PySide6.QtCore import Qt, Signal, QThread, QAbstractTableModel, QModelIndex, QSignalBlocker, QStandardPaths
 from PySide6.QtGui import QFont, QColor, QPalette
 
 
@@ -44,34 +58,86 @@ ALLELE_DICT = {
     "HLA-B5801": "1,2,9"
 }
 
+ALLELE_CLEAN_TABLE = str.maketrans("", "", "*:")
 
-def calculate_immunogenicity(peptide: str, allele: str = None) -> float:
-    peptide = peptide.upper()
-    peplen = len(peptide)
-    cterm = peplen - 1
-    score = 0.0
 
+@lru_cache(maxsize=256)
+def get_mask_positions(allele: Optional[str], peplen: int) -> frozenset:
     if allele:
-        clean_allele = allele.replace("*", "").replace(":", "")
+        clean_allele = allele.translate(ALLELE_CLEAN_TABLE)
         if clean_allele in ALLELE_DICT:
-            mask_positions = [int(x) - 1 for x in ALLELE_DICT[clean_allele].split(",")]
-        else:
-            mask_positions = [0, 1, cterm]
-    else:
-        mask_positions = [0, 1, cterm]
+            return frozenset(int(x) - 1 for x in ALLELE_DICT[clean_allele].split(","))
+    return frozenset((0, 1, peplen - 1))
+
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+AA_LUT = np.full(256, -1, dtype=np.int8)
+AA_LUT[np.frombuffer(AMINO_ACIDS.encode(), dtype=np.uint8)] = np.arange(len(AMINO_ACIDS))
+
+IMMUNOSCALE_ARR = np.array([IMMUNOSCALE[aa] for aa in AMINO_ACIDS])
+
 
+PEPTIDE_LENGTHS = range(8, 16)
+
+
+def build_immunogenicity_weights(mask_positions: frozenset, peplen: int) -> np.ndarray:
     if peplen > 9:
         pepweight = IMMUNOWEIGHT[:5] + [0.30] * (peplen - 9) + IMMUNOWEIGHT[5:]
     else:
         pepweight = IMMUNOWEIGHT[:peplen]
+    weights = np.array(pepweight)
+    weights[[m for m in mask_positions if 0 <= m < peplen]] = 0.0
+    weights.setflags(write=False)
+    return weights
+
+
+DEFAULT_WEIGHTS = {
+    peplen: build_immunogenicity_weights(get_mask_positions(None, peplen), peplen)
+    for peplen in PEPTIDE_LENGTHS
+}
+
+WEIGHTS_CACHE = {
+    (allele, peplen): build_immunogenicity_weights(get_mask_positions(allele, peplen), peplen)
+    for allele in ALLELE_DICT
+    for peplen in PEPTIDE_LENGTHS
+}
 
-    for i, aa in enumerate(peptide):
-        if aa not in IMMUNOSCALE:
-            return 0.0
-        if i not in mask_positions and i < len(pepweight):
-            score += pepweight[i] * IMMUNOSCALE[aa]
 
-    return round(score, 5)
+def get_immunogenicity_weights(allele: Optional[str], peplen: int) -> np.ndarray:
+    clean_allele = allele.translate(ALLELE_CLEAN_TABLE) if allele else ""
+    if peplen not in PEPTIDE_LENGTHS:
+        return build_immunogenicity_weights(get_mask_positions(clean_allele, peplen), peplen)
+    return WEIGHTS_CACHE.get((clean_allele, peplen), DEFAULT_WEIGHTS[peplen])
+
+
+def calculate_immunogenicity_batch(peptides: List[str], alleles: List[str]) -> np.ndarray:
+    peptides = [p.upper() for p in peptides]
+    scores = np.zeros(len(peptides))
+
+    groups: Dict[int, List[int]] = {}
+    for i, peptide in enumerate(peptides):
+        groups.setdefault(len(peptide), []).append(i)
+
+    for peplen, indices in groups.items():
+        if peplen == 0:
+            continue
+
+        buffer = "".join(peptides[i] for i in indices).encode("ascii", "replace")
+        codes = AA_LUT[np.frombuffer(buffer, dtype=np.uint8)].reshape(len(indices), peplen)
+
+        unique_alleles, inverse = np.unique([alleles[i] or "" for i in indices], return_inverse=True)
+        weights = np.vstack([get_immunogenicity_weights(a, peplen) for a in unique_alleles.tolist()])
+
+        group_scores = (IMMUNOSCALE_ARR[codes] * weights[inverse]).sum(axis=1)
+        group_scores[(codes < 0).any(axis=1)] = 0.0
+        scores[indices] = group_scores
+
+    return np.round(scores, 5)
+
+
+def calculate_immunogenicity(peptide: str, allele: str = None) -> float:
+    return float(calculate_immunogenicity_batch([peptide], [allele])[0])
 
 
 def tokenize_pattern(pattern: str) -> List[List[str]]:
@@ -93,39 +159,154 @@ def tokenize_pattern(pattern: str) -> List[List[str]]:
     return tokens
 
 
-def generate_variants_for_length(tokens: List[List[str]], length: int) -> Set[str]:
+def generate_variants_for_length(tokens: List[List[str]], length: int,
+                                 seen_windows: Optional[Set[tuple]] = None) -> Set[str]:
     variants = set()
     n = len(tokens)
     if n < length:
         return variants
 
+    if seen_windows is None:
+        seen_windows = set()
+
     for start in range(n - length + 1):
-        sequence = tokens[start:start + length]
+        window = tokens[start:start + length]
+        # Windows with the same option set at every position expand to the same variants
+        signature = tuple(frozenset(options) for options in window)
+        if signature in seen_windows:
+            continue
+        seen_windows.add(signature)
+        variants.update(map(''.join, product(*window)))
 
-        def generate_combinations(current: str, index: int):
-            if index == len(sequence):
-                variants.add(current)
-                return
-            for option in sequence[index]:
-                generate_combinations(current + option, index + 1)
+    return variants
 
-        generate_combinations('', 0)
 
-    return variants
+# Spawned workers re-import gui.py (PySide6, pandas, requests: ~0.65 s each) and
+# their variant sets are unpickled in the parent (~0.25 us per variant), so the
+# pool only beats serial expansion (~0.7 us per variant) from a few million variants
+PARALLEL_VARIANT_THRESHOLD = 3_000_000
+
+
+def count_expected_variants(tokens: List[List[str]], lengths: List[int]) -> int:
+    sizes = [len(options) for options in tokens]
+    return sum(
+        math.prod(sizes[start:start + length])
+        for length in lengths
+        for start in range(len(sizes) - length + 1)
+    )
+
+
+def expand_pattern(pattern: str, lengths: List[int]) -> frozenset:
+    tokens = tokenize_pattern(pattern)
+    seen_windows = set()
+    variants = set()
+    for length in lengths:
+        variants.update(generate_variants_for_length(tokens, length, seen_windows))
+    return frozenset(variants)
 
 
 def generate_all_variants(patterns: List[str], lengths: List[int]) -> List[str]:
     all_variants = set()
+
+    expected = sum(count_expected_variants(tokenize_pattern(p), lengths) for p in patterns)
+    workers = min(len(patterns), os.cpu_count() or 1)
+    if workers > 1 and expected > PARALLEL_VARIANT_THRESHOLD:
+        # spawn, not fork: forking the Qt process with live worker threads can deadlock
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as executor:
+            for variants in executor.map(expand_pattern, patterns, [lengths] * len(patterns), chunksize=1):
+                all_variants.update(variants)
+        return sorted(all_variants)
+
+    seen_windows = set()
     for pattern in patterns:
         tokens = tokenize_pattern(pattern)
         for length in lengths:
-            variants = generate_variants_for_length(tokens, length)
-            all_variants.update(variants)
-    return sorted(list(all_variants))
+            all_variants.update(generate_variants_for_length(tokens, length, seen_windows))
+    return sorted(all_variants)
 
 
 VALID_AMINO_ACIDS = set("ACDEFGHIKLMNPQRSTVWY")
 
+VALID_LUT = AA_LUT >= 0
+
+# IEDB response columns read by ApiWorker (lowercased)
+RESPONSE_COLUMNS = frozenset({
+    "peptide", "seq", "allele", "mhc", "score", "el_score", "percentile_rank", "rank", "ic50"
+})
+
+NUMERIC_COLUMNS = [
+    ("el_score", 4, float('inf')),
+    ("percentile_rank", 2, float('inf')),
+    ("ic50", 2, float('inf')),
+    ("immunogenicity", 5, float('-inf'))
+]
+
+PREDICTION_METHODS = ("netmhcpan_el", "netmhcpan_ba")
+
+RESULT_COLUMNS = ["peptide", "allele"] + [key for key, _, _ in NUMERIC_COLUMNS]
+
+RESULT_DTYPES = {"peptide": "category", "allele": "category"}
+RESULT_DTYPES.update((key, np.float32) for key, _, _ in NUMERIC_COLUMNS)
+
+# Threshold filters as (filter key, column, comparison), strictest first
+THRESHOLD_FILTERS = [
+    ("ic50_max", "ic50", np.less_equal),
+    ("percentile_max", "percentile_rank", np.less_equal),
+    ("el_score_min", "el_score", np.greater_equal),
+    ("immunogenicity_min", "immunogenicity", np.greater_equal)
+]
+
+
+def empty_results_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=RESULT_COLUMNS).astype(RESULT_DTYPES)
+
+
+def coalesce_columns(df: pd.DataFrame, *names: str) -> pd.Series:
+    result = pd.Series(np.nan, index=df.index, dtype=object)
+    for name in reversed(names):
+        if name in df.columns:
+            column = df[name]
+            result = column.where(column.notna() & (column != ""), result)
+    return result
+
+
+def combine_predictions(el: pd.DataFrame, ba: pd.DataFrame) -> pd.DataFrame:
+    if el.empty:
+        return el
+
+    result = pd.DataFrame({
+        "peptide": coalesce_columns(el, "peptide", "seq").fillna(""),
+        "allele": coalesce_columns(el, "allele", "mhc").fillna(""),
+        "el_score": coalesce_columns(el, "score", "el_score"),
+        "percentile_rank": coalesce_columns(el, "percentile_rank", "rank"),
+        "ic50": coalesce_columns(el, "ic50")
+    })
+
+    if "peptide" in ba.columns and "ic50" in ba.columns and "peptide" in el.columns:
+        ba_ic50 = ba.dropna(subset=["ic50"]).drop_duplicates("peptide", keep="last").set_index("peptide")["ic50"]
+        result["ic50"] = el["peptide"].map(ba_ic50).fillna(result["ic50"])
+
+    return result
+
+
+def build_results_frame(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return empty_results_frame()
+
+    df = pd.concat(frames, ignore_index=True)
+    numeric = ["el_score", "percentile_rank", "ic50"]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce")
+
+    has_peptide = (df["peptide"] != "").to_numpy()
+    immunogenicity = np.full(len(df), np.nan)
+    immunogenicity[has_peptide] = calculate_immunogenicity_batch(
+        df["peptide"][has_peptide].tolist(), df["allele"][has_peptide].tolist()
+    )
+    df["immunogenicity"] = immunogenicity
+    return df[RESULT_COLUMNS].astype(RESULT_DTYPES)
+
 
 def validate_peptide(peptide: str) -> tuple:
     peptide = peptide.upper().strip()
@@ -137,21 +318,149 @@ def validate_peptide(peptide: str) -> tuple:
     return True, peptide
 
 
+def validate_peptides_batch(peptides: List[str]) -> Tuple[List[str], List[str]]:
+    cleaned = [p.upper().strip() for p in peptides]
+    lengths = np.fromiter(map(len, cleaned), dtype=np.int64, count=len(cleaned))
+    ends = np.cumsum(lengths)
+
+    buffer = np.frombuffer("".join(cleaned).encode("ascii", "replace"), dtype=np.uint8)
+    bad_counts = np.concatenate(([0], np.cumsum(~VALID_LUT[buffer])))
+    ok = (bad_counts[ends] == bad_counts[ends - lengths]) & (lengths >= 8) & (lengths <= 15)
+
+    valid = []
+    invalid = []
+    for pep, peptide, is_valid in zip(peptides, cleaned, ok.tolist()):
+        if is_valid:
+            valid.append(peptide)
+        else:
+            invalid.append(f"{pep}: {validate_peptide(pep)[1]}")
+    return valid, invalid
+
+
+def format_fasta(peptides: List[str]) -> str:
+    parts = [None] * (2 * len(peptides))
+    parts[0::2] = [f">peptide{i}" for i in range(1, len(peptides) + 1)]
+    parts[1::2] = peptides
+    return "\n".join(parts)
+
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "mhci_cache")
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+def response_cache_path(method: str, allele: str, lengths: List[int], peptides: List[str]) -> str:
+    # Lengths keep their request order: IEDB pairs them with the alleles by position
+    key = "|".join([method, allele, ",".join(map(str, lengths)), ",".join(sorted(peptides))])
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".tsv.gz")
+
+
+def read_cached_response(path: str, max_age: float = CACHE_MAX_AGE) -> Optional[str]:
+    try:
+        if time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, EOFError):
+        return None
+
+
+def write_cached_response(path: str, text: str):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def clear_response_cache() -> int:
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+
+    removed = 0
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".tsv.gz"):
+            continue
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def session_path() -> str:
+    # Per-user application data directory, not the shared temp directory
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "last_session.npz")
+
+
+def save_session(df: pd.DataFrame):
+    path = session_path()
+    try:
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        session_dir = os.path.dirname(path)
+        os.makedirs(session_dir, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=session_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **{key: df[key].to_numpy(dtype=str if key in ("peptide", "allele") else np.float32)
+                           for key in RESULT_COLUMNS})
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def load_session() -> Optional[pd.DataFrame]:
+    try:
+        with np.load(session_path(), allow_pickle=False) as data:
+            return pd.DataFrame({key: data[key] for key in RESULT_COLUMNS}).astype(RESULT_DTYPES)
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+
+
+PROGRESS_INTERVAL = 0.05
+
+
 class ApiWorker(QThread):
-    finished = Signal(list)
+    finished = Signal(object)
     error = Signal(str)
     progress = Signal(str)
+    progress_count = Signal(int, int)
 
-    def __init__(self, peptides: List[str], alleles: List[str], lengths: List[int], delay: float):
+    def __init__(self, peptides: List[str], alleles: List[str], lengths: List[int], delay: float,
+                 max_workers: int = 8):
         super().__init__()
         self.peptides = peptides
         self.alleles = alleles
         self.lengths = lengths
         self.delay = delay
+        self.max_workers = max_workers
         self.api_url = "https://tools-cluster-interface.iedb.org/tools_api/mhci/"
 
-    def make_api_request(self, method: str, peptides: List[str], allele: str, lengths: List[int]) -> List[Dict]:
-        fasta = "\n".join([f">peptide{i+1}\n{p}" for i, p in enumerate(peptides)])
+        self.session = requests.Session()
+        retry = Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}), raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry)
+        self.session.mount("https://", adapter)
+
+        self._request_lock = threading.Lock()
+        self._next_request_time = 0.0
+
+    def wait_for_request_slot(self):
+        with self._request_lock:
+            wait = self._next_request_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next_request_time = time.monotonic() + self.delay
+
+    def make_api_request(self, method: str, peptides: List[str], allele: str, lengths: List[int]) -> pd.DataFrame:
+        fasta = format_fasta(peptides)
         data = {
             "method": method,
             "sequence_text": fasta,
@@ -159,189 +468,181 @@ class ApiWorker(QThread):
             "length": ",".join(map(str, lengths))
         }
 
-        try:
-            response = requests.post(self.api_url, data=data, timeout=60)
-
-            if response.status_code != 200:
-                self.progress.emit(f"API error: {response.status_code}")
-                return []
+        cache_path = response_cache_path(method, allele, lengths, peptides)
 
-            text = response.text.strip()
+        try:
+            text = read_cached_response(cache_path)
 
-            if "invalid character" in text.lower() or "error" in text.lower() or not text.startswith("allele\t"):
-                self.progress.emit(f"API error: {text[:100]}")
-                return []
+            if text is None:
+                self.wait_for_request_slot()
+                response = self.session.post(self.api_url, data=data, timeout=60)
 
-            lines = text.split("\n")
+                if response.status_code != 200:
+                    self.progress.emit(f"API error: {response.status_code}")
+                    return pd.DataFrame()
 
-            if len(lines) < 2:
-                return []
+                text = response.text.strip()
 
-            headers = lines[0].split("\t")
-            results = []
+                if "invalid character" in text.lower() or "error" in text.lower() or not text.startswith("allele\t"):
+                    self.progress.emit(f"API error: {text[:100]}")
+                    return pd.DataFrame()
 
-            for line in lines[1:]:
-                if not line.strip():
-                    continue
-                values = line.split("\t")
-                row = {}
-                for j, header in enumerate(headers):
-                    if j < len(values):
-                        row[header.lower()] = values[j]
-                results.append(row)
+                write_cached_response(cache_path, text)
 
-            return results
+            return pd.read_csv(
+                io.StringIO(text), sep="\t", dtype=str,
+                usecols=lambda c: c.lower() in RESPONSE_COLUMNS
+            ).rename(columns=str.lower)
         except Exception as e:
             self.progress.emit(f"Request error: {str(e)}")
-            return []
+            return pd.DataFrame()
 
     def run(self):
         try:
-            valid_peptides = []
-            invalid_peptides = []
-
-            for pep in self.peptides:
-                is_valid, result = validate_peptide(pep)
-                if is_valid:
-                    valid_peptides.append(result)
-                else:
-                    invalid_peptides.append(f"{pep}: {result}")
+            valid_peptides, invalid_peptides = validate_peptides_batch(self.peptides)
 
             if invalid_peptides:
                 self.progress.emit(f"Skipped {len(invalid_peptides)} invalid peptides")
 
+            unique_peptides = list(dict.fromkeys(valid_peptides))
+            if len(unique_peptides) < len(valid_peptides):
+                self.progress.emit(f"Skipped {len(valid_peptides) - len(unique_peptides)} duplicate peptides")
+            valid_peptides = unique_peptides
+
             if not valid_peptides:
                 self.error.emit("No valid peptides to analyze")
                 return
 
-            all_results = []
             total_alleles = len(self.alleles)
 
             self.progress.emit(f"Analyzing {len(valid_peptides)} peptides with {total_alleles} allele(s)")
 
-            for i, allele in enumerate(self.alleles):
-                self.progress.emit(f"Processing allele {i + 1}/{total_alleles}: {allele}")
-
-                if i > 0:
-                    self.msleep(int(self.delay * 1000))
-
-                el_results = self.make_api_request("netmhcpan_el", valid_peptides, allele, self.lengths)
-
-                if el_results:
-                    self.msleep(int(self.delay * 1000))
-                    ba_results = self.make_api_request("netmhcpan_ba", valid_peptides, allele, self.lengths)
-
-                    ba_dict = {}
-                    for ba_row in ba_results:
-                        pep = ba_row.get("peptide", "")
-                        ba_dict[pep] = ba_row
-
-                    for el_row in el_results:
-                        combined = dict(el_row)
-                        pep = el_row.get("peptide", "")
-                        if pep in ba_dict:
-                            ba_row = ba_dict[pep]
-                            if "ic50" in ba_row:
-                                combined["ic50"] = ba_row["ic50"]
-                        all_results.append(combined)
-
-            normalized = []
-            for row in all_results:
-                peptide = row.get("peptide") or row.get("seq") or ""
-                allele_val = row.get("allele") or row.get("mhc") or ""
-
-                el_score = None
-                score_val = row.get("score") or row.get("el_score")
-                if score_val is not None and score_val != "":
-                    try:
-                        el_score = float(score_val)
-                    except (ValueError, TypeError):
-                        pass
-
-                percentile = None
-                pct_val = row.get("percentile_rank") or row.get("rank")
-                if pct_val is not None and pct_val != "":
-                    try:
-                        percentile = float(pct_val)
-                    except (ValueError, TypeError):
-                        pass
-
-                ic50 = None
-                ic50_val = row.get("ic50")
-                if ic50_val is not None and ic50_val != "":
-                    try:
-                        ic50 = float(ic50_val)
-                    except (ValueError, TypeError):
-                        pass
-
-                immunogenicity = calculate_immunogenicity(peptide, allele_val) if peptide else None
-
-                normalized.append({
-                    "peptide": peptide,
-                    "allele": allele_val,
-                    "el_score": el_score,
-                    "percentile_rank": percentile,
-                    "ic50": ic50,
-                    "immunogenicity": immunogenicity
-                })
-
-            self.progress.emit(f"Completed: {len(normalized)} results")
-            self.finished.emit(normalized)
+            tasks = [(allele, method) for allele in self.alleles for method in PREDICTION_METHODS]
+            responses = {}
+            workers = max(1, min(self.max_workers, len(tasks)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self.make_api_request, method, valid_peptides, allele, self.lengths): (allele, method)
+                    for allele, method in tasks
+                }
+                self.progress_count.emit(0, len(tasks))
+                last_emit = 0.0
+                for done, future in enumerate(as_completed(futures), start=1):
+                    responses[futures[future]] = future.result()
+                    now = time.monotonic()
+                    if done == len(tasks) or now - last_emit >= PROGRESS_INTERVAL:
+                        self.progress_count.emit(done, len(tasks))
+                        last_emit = now
+
+            df = build_results_frame([
+                combine_predictions(responses[allele, "netmhcpan_el"], responses[allele, "netmhcpan_ba"])
+                for allele in self.alleles
+            ])
+
+            self.progress.emit(f"Completed: {len(df)} results")
+            self.finished.emit(df)
 
         except Exception as e:
             self.error.emit(f"Worker error: {str(e)}")
+        finally:
+            self.session.close()
+
+
+DATA_ROLES = frozenset({Qt.DisplayRole, Qt.EditRole, Qt.UserRole})
+
+
+class ResultsModel(QAbstractTableModel):
+    headers = ["Peptide", "Allele", "EL Score", "Percentile Rank", "IC50 (nM)", "Immunogenicity"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self._set_frame(empty_results_frame())
+
+    def _set_frame(self, df: pd.DataFrame):
+        self._df = df
+        self._columns = [self._df[key].cat.codes.to_numpy() for key in ("peptide", "allele")]
+        self._labels = [self._df[key].cat.categories.to_numpy() for key in ("peptide", "allele")]
+        self._missing = [None, None]
+        self._sort_keys = [None, None]
+        for key, _, missing in NUMERIC_COLUMNS:
+            values = self._df[key].to_numpy()
+            is_missing = np.isnan(values)
+            self._columns.append(values)
+            self._missing.append(is_missing)
+            self._sort_keys.append(np.where(is_missing, missing, values))
+
+    def setDataFrame(self, df: pd.DataFrame):
+        self.beginResetModel()
+        self._set_frame(df)
+        if self.sort_column is not None:
+            self._sort_frame(self.sort_column, self.sort_order)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._df)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(RESULT_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role not in DATA_ROLES or not index.isValid():
+            return None
+
+        row, col = index.row(), index.column()
+        if col < 2:
+            return str(self._labels[col][self._columns[col][row]])
+
+        if role == Qt.DisplayRole:
+            if self._missing[col][row]:
+                return "N/A"
+            return f"{self._columns[col][row]:.{NUMERIC_COLUMNS[col - 2][1]}f}"
+        return float(self._sort_keys[col][row])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def _sort_frame(self, column: int, order):
+        ascending = order == Qt.AscendingOrder
+        na_last = column < 2 or NUMERIC_COLUMNS[column - 2][2] > 0
+        self._set_frame(self._df.sort_values(
+            RESULT_COLUMNS[column], ascending=ascending, kind="mergesort",
+            na_position="last" if na_last == ascending else "first"
+        ))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not 0 <= column < len(RESULT_COLUMNS):
+            return
+        self.sort_column = column
+        self.sort_order = order
+        self.beginResetModel()
+        self._sort_frame(column, order)
+        self.endResetModel()
 
 
-class ResultsTable(QTableWidget):
+class ResultsTable(QTableView):
     def __init__(self):
         super().__init__()
         self.setAlternatingRowColors(True)
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        self.setSortingEnabled(True)
         self.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.verticalHeader().setVisible(False)
         self.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
 
-        self.columns = ["Peptide", "Allele", "EL Score", "Percentile Rank", "IC50 (nM)", "Immunogenicity"]
-        self.setColumnCount(len(self.columns))
-        self.setHorizontalHeaderLabels(self.columns)
-
-    def load_data(self, results: List[Dict]):
-        self.setSortingEnabled(False)
-        self.setRowCount(len(results))
-
-        for i, row in enumerate(results):
-            peptide_val = str(row.get("peptide", ""))
-            allele_val = str(row.get("allele", ""))
-            self.setItem(i, 0, QTableWidgetItem(peptide_val))
-            self.setItem(i, 1, QTableWidgetItem(allele_val))
-
-            el_score = row.get("el_score")
-            el_item = QTableWidgetItem(f"{el_score:.4f}" if el_score is not None else "N/A")
-            el_item.setData(Qt.UserRole, el_score if el_score is not None else float('inf'))
-            self.setItem(i, 2, el_item)
-
-            percentile = row.get("percentile_rank")
-            pct_item = QTableWidgetItem(f"{percentile:.2f}" if percentile is not None else "N/A")
-            pct_item.setData(Qt.UserRole, percentile if percentile is not None else float('inf'))
-            self.setItem(i, 3, pct_item)
-
-            ic50 = row.get("ic50")
-            ic50_item = QTableWidgetItem(f"{ic50:.2f}" if ic50 is not None else "N/A")
-            ic50_item.setData(Qt.UserRole, ic50 if ic50 is not None else float('inf'))
-            self.setItem(i, 4, ic50_item)
-
-            immuno = row.get("immunogenicity")
-            immuno_item = QTableWidgetItem(f"{immuno:.5f}" if immuno is not None else "N/A")
-            immuno_item.setData(Qt.UserRole, immuno if immuno is not None else float('-inf'))
-            self.setItem(i, 5, immuno_item)
-
+        self.results_model = ResultsModel(self)
+        self.setModel(self.results_model)
         self.setSortingEnabled(True)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+    def load_data(self, df: pd.DataFrame):
+        self.results_model.setDataFrame(df)
 
     def clear_data(self):
-        self.setRowCount(0)
+        self.results_model.setDataFrame(empty_results_frame())
 
 
 class PredictionTab(QWidget):
@@ -639,33 +940,34 @@ class FilterTab(QWidget):
         self.decimal_sep_combo.addItems(["Dot (.)", "Comma (,)"])
         export_layout.addWidget(self.decimal_sep_combo, 1, 1)
 
+        self.clear_cache_btn = QPushButton("Clear Cache")
+        self.clear_cache_btn.clicked.connect(self.on_clear_cache_clicked)
+        export_layout.addWidget(self.clear_cache_btn, 2, 0, 1, 2)
+
         export_group.setLayout(export_layout)
         layout.addWidget(export_group)
 
         layout.addStretch()
 
-    def update_filter_lists(self, results: List[Dict]):
-        peptides = sorted(set(r.get("peptide", "") for r in results if r.get("peptide")))
-        alleles = sorted(set(r.get("allele", "") for r in results if r.get("allele")))
-
-        self.peptide_list.clear()
-        for p in peptides:
-            self.peptide_list.addItem(p)
-
-        self.allele_list.clear()
-        for a in alleles:
-            self.allele_list.addItem(a)
+    def update_filter_lists(self, df: pd.DataFrame):
+        for widget, key in ((self.peptide_list, "peptide"), (self.allele_list, "allele")):
+            values = df[key].cat.remove_unused_categories().cat.categories.sort_values()
+            widget.setUpdatesEnabled(False)
+            with QSignalBlocker(widget):
+                widget.clear()
+                widget.addItems(values[values != ""].tolist())
+            widget.setUpdatesEnabled(True)
 
     def on_apply_clicked(self):
         filters = {}
 
         if self.peptide_check.isChecked():
-            selected = [item.text() for item in self.peptide_list.selectedItems()]
+            selected = {item.text() for item in self.peptide_list.selectedItems()}
             if selected:
                 filters["peptides"] = selected
 
         if self.allele_check.isChecked():
-            selected = [item.text() for item in self.allele_list.selectedItems()]
+            selected = {item.text() for item in self.allele_list.selectedItems()}
             if selected:
                 filters["alleles"] = selected
 
@@ -698,6 +1000,10 @@ class FilterTab(QWidget):
         self.allele_list.clearSelection()
         self.clear_filter.emit()
 
+    def on_clear_cache_clicked(self):
+        removed = clear_response_cache()
+        QMessageBox.information(self, "Cache Cleared", f"Removed {removed} cached API responses")
+
     def get_csv_separator(self) -> str:
         text = self.csv_sep_combo.currentText()
         if "Tab" in text:
@@ -716,12 +1022,18 @@ class FilterTab(QWidget):
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.current_results = []
-        self.filtered_results = []
+        self.current_df = empty_results_frame()
+        self.filtered_df = self.current_df
         self.is_filtered = False
+        self.last_filters = None
+        self.last_filtered_df = None
         self.worker = None
         self.setup_ui()
 
+        df = load_session()
+        if df is not None and not df.empty:
+            self.show_results(df, f"Restored {len(df)} results from last session")
+
     def setup_ui(self):
         self.setWindowTitle("MHC-I Binding Predictor")
         self.setMinimumSize(1000, 700)
@@ -808,20 +1120,30 @@ class MainWindow(QMainWindow):
         self.worker.finished.connect(self.on_predictions_finished)
         self.worker.error.connect(self.on_predictions_error)
         self.worker.progress.connect(self.on_progress_update)
+        self.worker.progress_count.connect(self.on_progress_count)
         self.worker.start()
 
-    def on_predictions_finished(self, results: List[Dict]):
+    def on_predictions_finished(self, df: pd.DataFrame):
         self.progress_bar.setVisible(False)
         self.set_controls_enabled(True)
+        self.show_results(df, f"Predictions completed: {len(df)} results")
+        save_session(df)
 
-        self.current_results = results
-        self.filtered_results = []
+    def show_results(self, df: pd.DataFrame, message: str):
+        self.current_df = df
+        self.filtered_df = df
         self.is_filtered = False
+        self.last_filters = None
+        self.last_filtered_df = None
+
+        self.results_table.load_data(df)
+        self.filter_tab.update_filter_lists(df)
+        self.update_counts(message)
 
-        self.results_table.load_data(results)
-        self.filter_tab.update_filter_lists(results)
-        self.results_count_label.setText(f"{len(results)} results")
-        self.status_bar.showMessage(f"Predictions completed: {len(results)} results")
+    def update_counts(self, message: str):
+        suffix = " (filtered)" if self.is_filtered else ""
+        self.results_count_label.setText(f"{len(self.filtered_df)} results{suffix}")
+        self.status_bar.showMessage(message)
 
     def on_predictions_error(self, error_msg: str):
         self.progress_bar.setVisible(False)
@@ -832,6 +1154,10 @@ class MainWindow(QMainWindow):
     def on_progress_update(self, message: str):
         self.status_bar.showMessage(message)
 
+    def on_progress_count(self, done: int, total: int):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
     def set_controls_enabled(self, enabled: bool):
         self.prediction_tab.run_btn.setEnabled(enabled)
         self.pattern_tab.generate_btn.setEnabled(enabled)
@@ -839,54 +1165,52 @@ class MainWindow(QMainWindow):
         self.filter_tab.apply_btn.setEnabled(enabled)
 
     def apply_filters(self, filters: Dict):
-        if not self.current_results:
+        df = self.current_df
+        if df.empty:
             QMessageBox.warning(self, "No Data", "No results to filter")
             return
 
-        filtered = list(self.current_results)
-
-        if "peptides" in filters:
-            filtered = [r for r in filtered if r.get("peptide") in filters["peptides"]]
-
-        if "alleles" in filters:
-            filtered = [r for r in filtered if r.get("allele") in filters["alleles"]]
+        if filters == self.last_filters:
+            if self.is_filtered:
+                return
+            filtered = self.last_filtered_df
+        else:
+            mask = np.ones(len(df), dtype=bool)
 
-        if "el_score_min" in filters:
-            threshold = filters["el_score_min"]
-            filtered = [r for r in filtered if r.get("el_score") is not None and r["el_score"] >= threshold]
+            if "peptides" in filters:
+                mask &= df["peptide"].isin(filters["peptides"]).to_numpy()
 
-        if "percentile_max" in filters:
-            threshold = filters["percentile_max"]
-            filtered = [r for r in filtered if r.get("percentile_rank") is not None and r["percentile_rank"] <= threshold]
+            if "alleles" in filters:
+                mask &= df["allele"].isin(filters["alleles"]).to_numpy()
 
-        if "ic50_max" in filters:
-            threshold = filters["ic50_max"]
-            filtered = [r for r in filtered if r.get("ic50") is not None and r["ic50"] <= threshold]
+            passed = np.empty(len(df), dtype=bool)
+            for key, column, compare in THRESHOLD_FILTERS:
+                if key in filters:
+                    compare(df[column].to_numpy(), filters[key], out=passed)
+                    mask &= passed
 
-        if "immunogenicity_min" in filters:
-            threshold = filters["immunogenicity_min"]
-            filtered = [r for r in filtered if r.get("immunogenicity") is not None and r["immunogenicity"] >= threshold]
+            filtered = df[mask]
+            self.last_filters = dict(filters)
+            self.last_filtered_df = filtered
 
-        self.filtered_results = filtered
+        self.filtered_df = filtered
         self.is_filtered = True
         self.results_table.load_data(filtered)
-        self.results_count_label.setText(f"{len(filtered)} results (filtered)")
-        self.status_bar.showMessage(f"Filtered to {len(filtered)} results")
+        self.update_counts(f"Filtered to {len(filtered)} results")
 
     def clear_filters(self):
-        if not self.current_results:
+        if self.current_df.empty:
             return
 
         self.is_filtered = False
-        self.filtered_results = []
-        self.results_table.load_data(self.current_results)
-        self.results_count_label.setText(f"{len(self.current_results)} results")
-        self.status_bar.showMessage("Showing all results")
+        self.filtered_df = self.current_df
+        self.results_table.load_data(self.current_df)
+        self.update_counts("Showing all results")
 
     def export_results(self):
-        results = self.filtered_results if self.is_filtered else self.current_results
+        results = self.filtered_df if self.is_filtered else self.current_df
 
-        if not results:
+        if results.empty:
             QMessageBox.warning(self, "No Data", "No results to export")
             return
 
@@ -900,47 +1224,51 @@ class MainWindow(QMainWindow):
         csv_sep = self.filter_tab.get_csv_separator()
         decimal_sep = self.filter_tab.get_decimal_separator()
 
-        def format_number(val, decimals):
-            if val is None:
-                return ""
-            formatted = f"{val:.{decimals}f}"
-            if decimal_sep == ",":
-                formatted = formatted.replace(".", ",")
-            return formatted
+        isnan = math.isnan
+
+        if decimal_sep == ",":
+            def format_number(val, decimals):
+                return "" if isnan(val) else f"{val:.{decimals}f}".replace(".", ",")
+        else:
+            def format_number(val, decimals):
+                return "" if isnan(val) else f"{val:.{decimals}f}"
 
         headers = ["Peptide", "Allele", "EL Score", "Percentile Rank", "IC50 (nM)", "Immunogenicity"]
-        lines = [csv_sep.join(headers)]
-
-        for r in results:
-            row = [
-                r.get("peptide", ""),
-                r.get("allele", ""),
-                format_number(r.get("el_score"), 4),
-                format_number(r.get("percentile_rank"), 2),
-                format_number(r.get("ic50"), 2),
-                format_number(r.get("immunogenicity"), 5)
-            ]
-            lines.append(csv_sep.join(row))
-
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(lines))
+        rows = results[RESULT_COLUMNS].itertuples(index=False, name=None)
+
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=csv_sep, lineterminator='\n')
+            writer.writerow(headers)
+            writer.writerows(
+                (
+                    peptide,
+                    allele,
+                    format_number(el_score, 4),
+                    format_number(percentile_rank, 2),
+                    format_number(ic50, 2),
+                    format_number(immunogenicity, 5)
+                )
+                for peptide, allele, el_score, percentile_rank, ic50, immunogenicity in rows
+            )
 
         result_type = "filtered" if self.is_filtered else "all"
         self.status_bar.showMessage(f"Exported {len(results)} {result_type} results to {file_path}")
 
     def clear_results(self):
-        self.current_results = []
-        self.filtered_results = []
+        self.current_df = empty_results_frame()
+        self.filtered_df = self.current_df
         self.is_filtered = False
+        self.last_filters = None
+        self.last_filtered_df = None
         self.results_table.clear_data()
-        self.filter_tab.peptide_list.clear()
-        self.filter_tab.allele_list.clear()
-        self.results_count_label.setText("0 results")
-        self.status_bar.showMessage("Results cleared")
+        self.filter_tab.update_filter_lists(self.current_df)
+        save_session(self.current_df)
+        self.update_counts("Results cleared")
 
 
 def main():
     app = QApplication(sys.argv)
+    app.setApplicationName("mhci_binding_predictor")
     app.setStyle('Fusion')
 
     palette = QPalette()
@@ -4,18 +4,39 @@ Optimized MHC-I Binding Predictor
 Unified tool for peptide-MHC binding prediction using IEDB API
 """
 
+from __future__ import annotations
+
+import csv
+import importlib.util
+import io
 import os
+import gzip
+import hashlib
 import logging
+import math
+import mmap
+import random
+import shelve
 import tempfile
 import numpy as np
-import pandas as pd
-import requests
 import time
+import threading
 import click
-from typing import List, Union, Optional, Dict, Any
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice, product
+from typing import List, Union, Optional, Dict, Any, Iterable, Iterator
 import re
+import sys
 import textwrap
 
+# pandas (~0.4 s) is imported inside the functions that use it, so commands like
+# `variants` and `--help` never load it; pd annotations stay unevaluated strings
+
+# Optional: pyarrow parses CSV files with multiple threads (probed without importing it)
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
 # Logger configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -23,13 +44,141 @@ logging.basicConfig(
 )
 logger = logging.getLogger("IEDBBindingPredictor")
 
+# Immunogenicity calculation tables
+IMMUNOSCALE = {
+    "A": 0.127, "C": -0.175, "D": 0.072, "E": 0.325, "F": 0.380, "G": 0.110,
+    "H": 0.105, "I": 0.432, "K": -0.700, "L": -0.036, "M": -0.570, "N": -0.021,
+    "P": -0.036, "Q": -0.376, "R": 0.168, "S": -0.537, "T": 0.126, "V": 0.134,
+    "W": 0.719, "Y": -0.012
+}
+
+IMMUNOWEIGHT = [0.00, 0.00, 0.10, 0.31, 0.30, 0.29, 0.26, 0.18, 0.00]
+
+# Byte-indexed lookup table for vectorized scoring (NaN marks invalid residues)
+IMMUNOSCALE_LUT = np.full(256, np.nan)
+for _aa, _value in IMMUNOSCALE.items():
+    IMMUNOSCALE_LUT[ord(_aa)] = _value
+
+
+@lru_cache(maxsize=32)
+def build_pepweight(peplen: int) -> tuple:
+    """Position weights for a peptide length; long peptides get 0.30 for the extra middle positions."""
+    if peplen > 9:
+        return tuple(IMMUNOWEIGHT[:5] + [0.30] * (peplen - 9) + IMMUNOWEIGHT[5:])
+    return tuple(IMMUNOWEIGHT[:peplen])
+
+
+# Allele anchor positions
+ALLELE_DICT = {
+    "H-2-Db": "2,5,9", "H-2-Dd": "2,3,5", "H-2-Kb": "2,3,9", "H-2-Kd": "2,5,9",
+    "H-2-Kk": "2,8,9", "H-2-Ld": "2,5,9", "HLA-A0101": "2,3,9", "HLA-A0201": "1,2,9",
+    "HLA-A0202": "1,2,9", "HLA-A0203": "1,2,9", "HLA-A0206": "1,2,9", "HLA-A0211": "1,2,9",
+    "HLA-A0301": "1,2,9", "HLA-A1101": "1,2,9", "HLA-A2301": "2,7,9", "HLA-A2402": "2,7,9",
+    "HLA-A2601": "1,2,9", "HLA-A2902": "2,7,9", "HLA-A3001": "1,3,9", "HLA-A3002": "2,7,9",
+    "HLA-A3101": "1,2,9", "HLA-A3201": "1,2,9", "HLA-A3301": "1,2,9", "HLA-A6801": "1,2,9",
+    "HLA-A6802": "1,2,9", "HLA-A6901": "1,2,9", "HLA-B0702": "1,2,9", "HLA-B0801": "2,5,9",
+    "HLA-B1501": "1,2,9", "HLA-B1502": "1,2,9", "HLA-B1801": "1,2,9", "HLA-B2705": "2,3,9",
+    "HLA-B3501": "1,2,9", "HLA-B3901": "1,2,9", "HLA-B4001": "1,2,9", "HLA-B4002": "1,2,9",
+    "HLA-B4402": "2,3,9", "HLA-B4403": "2,3,9", "HLA-B4501": "1,2,9", "HLA-B4601": "1,2,9",
+    "HLA-B5101": "1,2,9", "HLA-B5301": "1,2,9", "HLA-B5401": "1,2,9", "HLA-B5701": "1,2,9",
+    "HLA-B5801": "1,2,9"
+}
+
+# Strips "*" and ":" so "HLA-A*02:01" matches the "HLA-A0201" keys above
+ALLELE_CLEAN_TABLE = str.maketrans("", "", "*:")
+
+# Response columns are only parsed if their name contains one of these
+# (skips start, end, core, icore)
+RESPONSE_COLUMN_KEYWORDS = ('seq', 'peptide', 'epitope', 'allele', 'mhc', 'hla', 'score', 'rank', 'ic50', 'length')
+
+# Raw IEDB responses older than this are fetched again
+RESPONSE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Peptides are sent to IEDB in batches of this size (CLI --chunk-size default)
+PEPTIDE_CHUNK_SIZE = 2000
+
+# Rows parsed at a time by the CLI filter command without pyarrow
+FILTER_CHUNK_SIZE = 200000
+
+# Bytes of a peptide file decoded and split at a time
+FILE_BLOCK_SIZE = 1 << 22
+
+# Longest --peptides value still checked as a file path (Linux PATH_MAX)
+MAX_PATH_LENGTH = 4096
+
+# Result files with this suffix are written and read as Parquet instead of CSV
+PARQUET_SUFFIX = ".parquet"
+
+# Variants expanded at a time when writing pattern variants as bytes
+VARIANT_BLOCK_SIZE = 1 << 16
+
+# Largest variant count the int64 mixed-radix counter of iter_variant_blocks can index
+MAX_INDEXED_VARIANTS = np.iinfo(np.int64).max
+
+# IEDB request timeouts (seconds); the read timeout grows with the number of
+# peptide/allele pairs in the request, up to API_READ_TIMEOUT_MAX
+API_CONNECT_TIMEOUT = 5
+API_READ_TIMEOUT = 60
+API_READ_TIMEOUT_PER_PAIR = 0.002
+API_READ_TIMEOUT_MAX = 600
+
+# Attempts per request when IEDB times out or drops the connection
+API_MAX_ATTEMPTS = 3
+
+# Common column name mappings from IEDB API (keys are lowercase)
+# API returns: allele, seq_num, start, end, length, peptide, core, icore, score, percentile_rank
+# For BA: allele, seq_num, start, end, length, peptide, core, icore, ic50, percentile_rank
+COLUMN_MAPPINGS = {
+    # Peptide sequence columns - API returns 'peptide' directly
+    'peptide': 'peptide',
+    'seq': 'peptide',
+    'sequence': 'peptide',
+    'epitope': 'peptide',
+    'peptide_seq': 'peptide',
+
+    # Allele columns - API returns 'allele' directly
+    'allele': 'allele',
+    'mhc': 'allele',
+    'hla': 'allele',
+    'mhc_allele': 'allele',
+    'hla_allele': 'allele',
+
+    # Score columns - API returns 'score' for EL method
+    'score': 'el_score',
+    'netmhcpan_el_score': 'el_score',
+    'netmhcpan_ba_score': 'ba_score',
+
+    # Percentile columns - API returns 'percentile_rank' directly
+    'percentile_rank': 'percentile_rank',
+    'rank': 'percentile_rank',
+    'el_rank': 'percentile_rank',
+
+    # IC50 columns - API returns 'ic50' directly for BA method
+    'ic50': 'ic50',
+    'netmhcpan_ba_ic50': 'ic50',
+    'ba_ic50': 'ic50'
+}
+
+# Keywords used to infer the peptide/allele columns when no mapping matched
+INFERRED_COLUMN_KEYWORDS = {
+    'peptide': ('seq', 'peptide', 'epitope'),
+    'allele': ('allele', 'mhc', 'hla')
+}
+
 class IEDBBindingPredictor:
     """
     Optimized class for predicting peptide binding with MHC alleles using the IEDB API.
     """
     
-    def __init__(self, output_dir="./output", csv_separator=",", decimal_separator="."):
-        """Initialize the binding predictor."""
+    def __init__(self, output_dir="./output", csv_separator=",", decimal_separator=".",
+                 cache_file: Optional[str] = None, response_cache: bool = True):
+        """Initialize the binding predictor.
+        
+        If `cache_file` is given, predictions are persisted there (via shelve) and
+        reused by later runs; otherwise they are only cached for this instance.
+        With `response_cache`, raw API responses are also kept in memory and under
+        `output_dir/.iedb_cache` so identical requests are not sent again.
+        """
         self.output_dir = output_dir
         self.csv_separator = csv_separator
         self.decimal_separator = decimal_separator
@@ -37,30 +186,42 @@ class IEDBBindingPredictor:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Immunogenicity calculation variables
-        self.immunoscale = {
-            "A": 0.127, "C": -0.175, "D": 0.072, "E": 0.325, "F": 0.380, "G": 0.110, 
-            "H": 0.105, "I": 0.432, "K": -0.700, "L": -0.036, "M": -0.570, "N": -0.021, 
-            "P": -0.036, "Q": -0.376, "R": 0.168, "S": -0.537, "T": 0.126, "V": 0.134, 
-            "W": 0.719, "Y": -0.012
-        }
-        self.immunoweight = [0.00, 0.00, 0.10, 0.31, 0.30, 0.29, 0.26, 0.18, 0.00]
+        # Immunogenicity calculation variables (shared module-level tables)
+        self.immunoscale = IMMUNOSCALE
+        self.immunoweight = IMMUNOWEIGHT
+        self._immunoscale_lut = IMMUNOSCALE_LUT
+        
+        # Masked weight vectors, keyed by (clean allele, peptide length)
+        self._weight_cache: Dict[tuple, np.ndarray] = {}
+        
+        # Pooled keep-alive connections, retrying transient IEDB errors with backoff
+        # (requests is imported here so `variants` and `--help` never pay for it)
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self._session = requests.Session()
+        # Only status codes are retried here; timeouts and connection errors are
+        # retried (and re-throttled) by _make_api_request
+        retry = Retry(
+            total=5, connect=0, read=0, other=0, status=5, backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}), raise_on_status=False
+        )
+        self._session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry))
+        
+        # Request spacing shared by all worker threads
+        self._request_lock = threading.Lock()
+        self._next_request_time = 0.0
+        
+        # Prediction rows keyed by "allele|length|peptide"
+        self._cache_lock = threading.Lock()
+        self._prediction_cache = shelve.open(cache_file) if cache_file else {}
+        
+        # Raw API responses keyed by request payload hash
+        self._response_cache_dir = os.path.join(output_dir, ".iedb_cache") if response_cache else None
         
         # Allele anchor positions
-        self.allele_dict = {
-            "H-2-Db":"2,5,9", "H-2-Dd":"2,3,5", "H-2-Kb":"2,3,9", "H-2-Kd":"2,5,9", 
-            "H-2-Kk":"2,8,9", "H-2-Ld":"2,5,9", "HLA-A0101":"2,3,9", "HLA-A0201":"1,2,9", 
-            "HLA-A0202":"1,2,9", "HLA-A0203":"1,2,9", "HLA-A0206":"1,2,9", "HLA-A0211":"1,2,9", 
-            "HLA-A0301":"1,2,9", "HLA-A1101":"1,2,9", "HLA-A2301":"2,7,9", "HLA-A2402":"2,7,9", 
-            "HLA-A2601":"1,2,9", "HLA-A2902":"2,7,9", "HLA-A3001":"1,3,9", "HLA-A3002":"2,7,9", 
-            "HLA-A3101":"1,2,9", "HLA-A3201":"1,2,9", "HLA-A3301":"1,2,9", "HLA-A6801":"1,2,9", 
-            "HLA-A6802":"1,2,9", "HLA-A6901":"1,2,9", "HLA-B0702":"1,2,9", "HLA-B0801":"2,5,9", 
-            "HLA-B1501":"1,2,9", "HLA-B1502":"1,2,9", "HLA-B1801":"1,2,9", "HLA-B2705":"2,3,9", 
-            "HLA-B3501":"1,2,9", "HLA-B3901":"1,2,9", "HLA-B4001":"1,2,9", "HLA-B4002":"1,2,9", 
-            "HLA-B4402":"2,3,9", "HLA-B4403":"2,3,9", "HLA-B4501":"1,2,9", "HLA-B4601":"1,2,9", 
-            "HLA-B5101":"1,2,9", "HLA-B5301":"1,2,9", "HLA-B5401":"1,2,9", "HLA-B5701":"1,2,9",
-            "HLA-B5801":"1,2,9"
-        }
+        self.allele_dict = ALLELE_DICT
         
         logger.info(f"Initialized binding predictor")
         logger.info(f"Output directory: {output_dir}")
@@ -76,80 +237,88 @@ class IEDBBindingPredictor:
         # Log current columns for debugging
         logger.info(f"API response columns: {list(df.columns)}")
         
-        # Common column name mappings from IEDB API
-        # API returns: allele, seq_num, start, end, length, peptide, core, icore, score, percentile_rank
-        # For BA: allele, seq_num, start, end, length, peptide, core, icore, ic50, percentile_rank
-        column_mappings = {
-            # Peptide sequence columns - API returns 'peptide' directly
-            'peptide': 'peptide',
-            'seq': 'peptide',
-            'sequence': 'peptide',
-            'epitope': 'peptide',
-            'peptide_seq': 'peptide',
-
-            # Allele columns - API returns 'allele' directly
-            'allele': 'allele',
-            'mhc': 'allele',
-            'hla': 'allele',
-            'mhc_allele': 'allele',
-            'hla_allele': 'allele',
-
-            # Score columns - API returns 'score' for EL method
-            'score': 'el_score',
-            'netmhcpan_el_score': 'el_score',
-            'netmhcpan_ba_score': 'ba_score',
-
-            # Percentile columns - API returns 'percentile_rank' directly
-            'percentile_rank': 'percentile_rank',
-            'rank': 'percentile_rank',
-            'el_rank': 'percentile_rank',
-
-            # IC50 columns - API returns 'ic50' directly for BA method
-            'ic50': 'ic50',
-            'netmhcpan_ba_ic50': 'ic50',
-            'ba_ic50': 'ic50'
-        }
+        # Apply mappings (case-insensitive) in one rename; the first column wins per lowercase name.
+        # rename returns a new frame, so the input is left untouched without a full copy
+        lowered = {col.lower(): col for col in reversed(df.columns)}
+        df_normalized = df.rename(columns={
+            lowered[old_name]: new_name for old_name, new_name in COLUMN_MAPPINGS.items() if old_name in lowered
+        })
         
-        # Create a copy to avoid modifying original
-        df_normalized = df.copy()
-        
-        # Apply mappings (case-insensitive)
-        for old_name, new_name in column_mappings.items():
-            # Find matching column (case-insensitive)
-            matching_cols = [col for col in df_normalized.columns if col.lower() == old_name.lower()]
-            if matching_cols:
-                df_normalized = df_normalized.rename(columns={matching_cols[0]: new_name})
-        
-        # If we still don't have peptide/allele columns, try to infer them
-        if 'peptide' not in df_normalized.columns:
-            # Look for any column that might contain peptide sequences
-            potential_peptide_cols = [col for col in df_normalized.columns 
-                                    if any(keyword in col.lower() 
-                                          for keyword in ['seq', 'peptide', 'epitope'])]
-            if potential_peptide_cols:
-                df_normalized = df_normalized.rename(columns={potential_peptide_cols[0]: 'peptide'})
-                logger.info(f"Mapped '{potential_peptide_cols[0]}' to 'peptide'")
-        
-        if 'allele' not in df_normalized.columns:
-            # Look for any column that might contain allele names
-            potential_allele_cols = [col for col in df_normalized.columns 
-                                   if any(keyword in col.lower() 
-                                         for keyword in ['allele', 'mhc', 'hla'])]
-            if potential_allele_cols:
-                df_normalized = df_normalized.rename(columns={potential_allele_cols[0]: 'allele'})
-                logger.info(f"Mapped '{potential_allele_cols[0]}' to 'allele'")
+        # If we still don't have peptide/allele columns, try to infer them in one pass over the columns
+        missing = [target for target in INFERRED_COLUMN_KEYWORDS if target not in df_normalized.columns]
+        inferred = {}
+        for col in df_normalized.columns:
+            if not missing:
+                break
+            lower = col.lower()
+            for target in missing:
+                if any(keyword in lower for keyword in INFERRED_COLUMN_KEYWORDS[target]):
+                    inferred[col] = target
+                    missing.remove(target)
+                    logger.info(f"Mapped '{col}' to '{target}'")
+                    break
+        if inferred:
+            df_normalized = df_normalized.rename(columns=inferred)
         
         logger.info(f"Normalized columns: {list(df_normalized.columns)}")
         return df_normalized
     
-    def _make_api_request(self, method: str, peptides: List[str], alleles: List[str], lengths: List[int]) -> pd.DataFrame:
+    @staticmethod
+    def _response_key(method: str, peptides: List[str], alleles: List[str], lengths: List[int]) -> str:
+        # Order is part of the key: seq_num refers to the peptide order, and IEDB
+        # pairs the allele and length lists position by position
+        key = "|".join([method, ",".join(peptides), ",".join(alleles), ",".join(map(str, lengths))])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
+    def _read_cached_response(self, key: str) -> Optional[str]:
+        """Return a cached response text from disk, if present and fresh."""
+        if self._response_cache_dir is None:
+            return None
+        
+        path = os.path.join(self._response_cache_dir, key + ".tsv.gz")
+        try:
+            if time.time() - os.path.getmtime(path) > RESPONSE_CACHE_MAX_AGE:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, EOFError):
+            return None
+        return text
+    
+    def _write_cached_response(self, key: str, text: str):
+        """Store a response text atomically on disk."""
+        if self._response_cache_dir is None:
+            return
+        try:
+            os.makedirs(self._response_cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._response_cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, os.path.join(self._response_cache_dir, key + ".tsv.gz"))
+        except OSError as e:
+            logger.warning(f"Could not write response cache: {str(e)}")
+    
+    def _make_api_request(self, method: str, peptides: List[str], alleles: List[str], lengths: List[int],
+                          delay: float = 0.0) -> pd.DataFrame:
         """
         Make a single optimized API request to IEDB.
+        
+        Cached responses are returned without waiting; otherwise the request is
+        throttled by `delay` before it is sent.
         """
+        import pandas as pd
+        import requests
+        
         url = "https://tools-cluster-interface.iedb.org/tools_api/mhci/"
         
+        cache_key = self._response_key(method, peptides, alleles, lengths)
+        text = self._read_cached_response(cache_key)
+        if text is not None:
+            logger.info(f"Using cached {method} response for {len(peptides)} peptides, {len(alleles)} alleles")
+            return self._parse_response(text)
+        
         # Format sequences as FASTA
-        fasta_sequences = "\n".join([f">peptide{i+1}\n{p}" for i, p in enumerate(peptides)])
+        fasta_sequences = format_fasta(peptides)
         
         # Prepare data for the request
         data = {
@@ -159,75 +328,81 @@ class IEDBBindingPredictor:
             "length": ",".join(map(str, lengths))
         }
         
+        # Larger (batched) requests get proportionally more time to respond
+        read_timeout = min(API_READ_TIMEOUT_MAX,
+                           API_READ_TIMEOUT + API_READ_TIMEOUT_PER_PAIR * len(peptides) * len(alleles))
+        
         logger.info(f"Making API request with method={method}, {len(peptides)} peptides, {len(alleles)} alleles")
         
         try:
-            response = requests.post(url, data=data, timeout=60)
+            for attempt in range(API_MAX_ATTEMPTS):
+                self._throttle(delay)
+                try:
+                    response = self._session.post(url, data=data, timeout=(API_CONNECT_TIMEOUT, read_timeout))
+                    break
+                except (requests.Timeout, requests.ConnectionError) as e:
+                    if attempt == API_MAX_ATTEMPTS - 1:
+                        raise
+                    wait = min(30, 2 ** attempt + random.random())
+                    logger.warning(f"{method} request failed ({e}), retrying in {wait:.1f}s")
+                    time.sleep(wait)
             
             if response.status_code != 200:
                 logger.error(f"API request failed: {response.status_code} - {response.text}")
                 return pd.DataFrame()
             
-            # Parse response to DataFrame
-            lines = response.text.strip().split("\n")
-            if len(lines) < 2:
-                logger.warning("No results from API")
-                return pd.DataFrame()
-            
-            # Create temporary file to parse CSV properly
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.csv') as temp_file:
-                temp_file.write(response.text)
-                temp_file_path = temp_file.name
+            text = response.text.strip()
+            df = self._parse_response(text)
             
-            try:
-                df = pd.read_csv(temp_file_path, sep="\t")
-                os.remove(temp_file_path)
-                
-                # Normalize column names
-                df = self._normalize_column_names(df)
-                
-                return df
-            except Exception as e:
-                os.remove(temp_file_path)
-                logger.error(f"Error parsing API response: {str(e)}")
-                return pd.DataFrame()
+            # IEDB reports invalid input as plain text with status 200; only cache real results
+            if 'peptide' in df.columns and not df.empty:
+                self._write_cached_response(cache_key, text)
+            else:
+                logger.error(f"API error: {text[:100]}")
+            return df
                 
         except Exception as e:
             logger.error(f"API request error: {str(e)}")
             return pd.DataFrame()
     
+    def _parse_response(self, text: str) -> pd.DataFrame:
+        """Parse an IEDB TSV response into a DataFrame with normalized column names."""
+        import pandas as pd
+        
+        # A header line without any data rows means no results
+        if "\n" not in text:
+            logger.warning("No results from API")
+            return pd.DataFrame()
+        
+        # Parse the TSV response directly from memory with the C parser
+        try:
+            df = pd.read_csv(io.StringIO(text), sep="\t", engine="c", dtype={'allele': 'category'},
+                             usecols=lambda col: any(keyword in col.lower() for keyword in RESPONSE_COLUMN_KEYWORDS))
+            
+            # Normalize column names
+            df = self._normalize_column_names(df)
+            
+            return df
+        except Exception as e:
+            logger.error(f"Error parsing API response: {str(e)}")
+            return pd.DataFrame()
+    
     def calculate_immunogenicity_score(self, peptide: str, allele: str = None) -> float:
         """Calculate immunogenicity score for a peptide."""
         peptide = peptide.upper()
-        peplen = len(peptide)
-        cterm = peplen - 1
-        score = 0
-        
-        # Determine mask positions
-        if allele:
-            clean_allele = allele.replace("*", "").replace(":", "")
-            if clean_allele in self.allele_dict:
-                mask_str = self.allele_dict[clean_allele].split(",")
-                mask_positions = [int(x) - 1 for x in mask_str]  # Convert to 0-based
-            else:
-                mask_positions = [0, 1, cterm]  # Default mask
-        else:
-            mask_positions = [0, 1, cterm]  # Default mask
         
-        # Adjust weights for longer peptides
-        if peplen > 9:
-            pepweight = self.immunoweight[:5] + ([0.30] * (peplen - 9)) + self.immunoweight[5:]
-        else:
-            pepweight = self.immunoweight[:peplen]
+        # Position weights with the allele's anchor positions already zeroed (cached)
+        weights = self._immunogenicity_weights(allele, len(peptide)).tolist()
+        immunoscale = self.immunoscale
+        score = 0
         
         try:
-            for i, aa in enumerate(peptide):
-                if aa not in self.immunoscale:
+            for weight, aa in zip(weights, peptide):
+                scale = immunoscale.get(aa)
+                if scale is None:
                     logger.warning(f"Invalid amino acid '{aa}' in peptide {peptide}")
                     return 0.0
-                
-                if i not in mask_positions and i < len(pepweight):
-                    score += pepweight[i] * self.immunoscale[aa]
+                score += weight * scale
             
             return round(score, 5)
         
@@ -235,10 +410,246 @@ class IEDBBindingPredictor:
             logger.error(f"Error calculating immunogenicity for {peptide}: {str(e)}")
             return 0.0
     
-    def predict_comprehensive(self, peptides: List[str], alleles: List[str], lengths: List[int] = None, delay: float = 2.0) -> pd.DataFrame:
+    def _immunogenicity_weights(self, allele: Optional[str], peplen: int) -> np.ndarray:
+        """Return the position weights for a peptide length with anchor positions zeroed."""
+        clean_allele = allele.translate(ALLELE_CLEAN_TABLE) if allele else ""
+        if clean_allele not in self.allele_dict:
+            clean_allele = ""  # All unknown alleles share the default mask
+        
+        key = (clean_allele, peplen)
+        weights = self._weight_cache.get(key)
+        if weights is None:
+            weights = np.array(build_pepweight(peplen), dtype=np.float64)
+            
+            if clean_allele:
+                mask_positions = [int(x) - 1 for x in self.allele_dict[clean_allele].split(",")]
+            else:
+                mask_positions = [0, 1, peplen - 1]
+            weights[[m for m in mask_positions if 0 <= m < peplen]] = 0.0
+            self._weight_cache[key] = weights
+        
+        return weights
+    
+    def calculate_immunogenicity_scores(self, peptides: List[str], alleles: List[str]) -> np.ndarray:
+        """
+        Calculate immunogenicity scores for many (peptide, allele) pairs at once.
+        
+        Rows are grouped by (allele code, peptide length) so each group shares one
+        weight vector; a group's residues are gathered from one packed byte buffer
+        into an (n, length) matrix and scored with a single matrix-vector product.
+        Results match calculate_immunogenicity_score row by row.
+        """
+        import pandas as pd
+        
+        n = len(peptides)
+        scores = np.zeros(n)
+        if n == 0:
+            return scores
+        
+        peptides = [p.upper() for p in peptides]
+        lengths = np.fromiter(map(len, peptides), dtype=np.int64, count=n)
+        buffer = np.frombuffer("".join(peptides).encode("ascii", "replace"), dtype=np.uint8)
+        starts = np.cumsum(lengths) - lengths
+        
+        # Categorical allele codes; a missing allele shares the default mask with ""
+        allele_codes, allele_names = pd.factorize(pd.Series([allele or "" for allele in alleles], dtype=object))
+        group_keys = allele_codes * (int(lengths.max()) + 1) + lengths
+        order = np.argsort(group_keys, kind="stable")
+        boundaries = np.flatnonzero(np.diff(group_keys[order])) + 1
+        
+        for rows in np.split(order, boundaries):
+            peplen = int(lengths[rows[0]])
+            if peplen == 0:
+                continue
+            codes = buffer[starts[rows][:, None] + np.arange(peplen)]
+            weights = self._immunogenicity_weights(allele_names[allele_codes[rows[0]]], peplen)
+            scores[rows] = self._immunoscale_lut[codes] @ weights
+        
+        invalid = np.isnan(scores)
+        if invalid.any():
+            logger.warning(f"Invalid amino acids in {int(invalid.sum())} peptides, scored as 0.0")
+            scores[invalid] = 0.0
+        
+        return np.round(scores, 5)
+    
+    def _throttle(self, delay: float):
+        """Block until at least `delay` seconds have passed since the previous API request started."""
+        with self._request_lock:
+            wait = self._next_request_time - time.monotonic()
+            if wait > 0:
+                logger.info(f"Waiting {wait:.1f} seconds before next request...")
+                time.sleep(wait)
+            self._next_request_time = time.monotonic() + delay
+    
+    def _throttled_request(self, method: str, peptides: List[str], allele: str, lengths: List[int],
+                           delay: float) -> pd.DataFrame:
+        """Run one API request for a single allele, spaced from other requests by `delay`."""
+        logger.info(f"Getting {method} predictions for {allele}...")
+        return self._make_api_request(method, peptides, [allele], lengths, delay=delay)
+    
+    def _predict_allele(self, allele: str, peptides: List[str], lengths: List[int], delay: float) -> Optional[pd.DataFrame]:
+        """Run the EL and BA requests for a single allele concurrently and merge them."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            el_future = executor.submit(self._throttled_request, "netmhcpan_el", peptides, allele, lengths, delay)
+            ba_future = executor.submit(self._throttled_request, "netmhcpan_ba", peptides, allele, lengths, delay)
+            el_results = el_future.result()
+            ba_results = ba_future.result()
+        
+        return self._merge_predictions(allele, el_results, ba_results)
+    
+    def _predict_alleles_batched(self, alleles: List[str], peptides: List[str], lengths: List[int],
+                                 delay: float) -> Dict[str, Optional[pd.DataFrame]]:
         """
-        Make comprehensive predictions using both EL and BA methods with one request per allele.
+        Run one EL and one BA request covering several alleles and split the results per allele.
+        
+        Alleles absent from the returned dict (e.g. because the combined request failed)
+        should be retried one at a time.
         """
+        import pandas as pd
+        
+        # IEDB pairs the allele and length lists position by position
+        paired_alleles = [allele for allele in alleles for _ in lengths]
+        paired_lengths = [length for _ in alleles for length in lengths]
+        
+        logger.info(f"Getting combined predictions for {len(alleles)} alleles...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            el_future = executor.submit(self._make_api_request, "netmhcpan_el", peptides, paired_alleles, paired_lengths, delay)
+            ba_future = executor.submit(self._make_api_request, "netmhcpan_ba", peptides, paired_alleles, paired_lengths, delay)
+            el_results = el_future.result()
+            ba_results = ba_future.result()
+        
+        if el_results.empty or 'allele' not in el_results.columns:
+            return {}
+        
+        el_by_allele = dict(list(el_results.groupby('allele', sort=False)))
+        ba_by_allele = dict(list(ba_results.groupby('allele', sort=False))) if 'allele' in ba_results.columns else {}
+        
+        return {
+            allele: self._merge_predictions(allele, el_by_allele[allele], ba_by_allele.get(allele, pd.DataFrame()))
+            for allele in alleles if allele in el_by_allele
+        }
+    
+    def _merge_predictions(self, allele: str, el_results: pd.DataFrame,
+                           ba_results: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """Combine the EL and BA responses for a single allele into one row per EL prediction."""
+        if el_results.empty:
+            logger.warning(f"No EL results obtained for allele {allele}")
+            return None
+        
+        # Check if required columns exist
+        if 'peptide' not in el_results.columns or 'allele' not in el_results.columns:
+            logger.warning(f"Missing required columns in EL results for {allele}. Available columns: {list(el_results.columns)}")
+            return None
+        
+        # Select relevant columns from EL results
+        available_cols = ['allele', 'peptide', 'percentile_rank']
+        if 'el_score' in el_results.columns:
+            available_cols.append('el_score')
+        elif 'score' in el_results.columns:
+            available_cols.append('score')
+            el_results = el_results.rename(columns={'score': 'el_score'})
+            available_cols[-1] = 'el_score'
+        
+        # Keep the request position and length so results can be cached per input peptide
+        available_cols += ['seq_num', 'length']
+        
+        # Responses that already carry binding affinity need no BA join
+        available_cols.append('ic50')
+        
+        el_data = el_results[[col for col in available_cols if col in el_results.columns]].copy()
+        el_data['method'] = 'netmhcpan_el'
+        
+        if 'ic50' not in el_data.columns and ba_results is not None and not ba_results.empty:
+            # Check if required columns exist
+            if 'peptide' in ba_results.columns and 'ic50' in ba_results.columns:
+                # Both responses belong to this allele, so the peptide alone is the join key
+                ic50_by_peptide = ba_results.drop_duplicates('peptide').set_index('peptide')['ic50']
+                el_data['ic50'] = el_data['peptide'].map(ic50_by_peptide)
+        
+        logger.info(f"Completed predictions for {allele}: {len(el_data)} results")
+        return el_data
+    
+    @staticmethod
+    def _cache_key(peptide: str, allele: str, length: int) -> str:
+        return f"{allele}|{length}|{peptide}"
+    
+    def _store_predictions(self, allele: str, peptides: List[str], lengths: List[int], df: pd.DataFrame):
+        """
+        Cache the rows of a fresh prediction under each (peptide, allele, length) they came from.
+        
+        Rows are stored as plain record dicts, which are much cheaper to pickle and to
+        rebuild into one DataFrame than many single-row frames.
+        """
+        import pandas as pd
+        
+        if 'seq_num' not in df.columns or 'length' not in df.columns or 'ic50' not in df.columns:
+            return
+        
+        seq_index = (pd.to_numeric(df['seq_num'], errors='coerce') - 1).tolist()
+        length_col = pd.to_numeric(df['length'], errors='coerce').tolist()
+        records_by_key: Dict[tuple, List[dict]] = {}
+        for key, record in zip(zip(seq_index, length_col), df.to_dict('records')):
+            records_by_key.setdefault(key, []).append(record)
+        
+        with self._cache_lock:
+            for i, peptide in enumerate(peptides):
+                for length in lengths:
+                    self._prediction_cache[self._cache_key(peptide, allele, length)] = records_by_key.get((i, length), [])
+            if hasattr(self._prediction_cache, 'sync'):
+                self._prediction_cache.sync()
+    
+    def _lookup_predictions(self, allele: str, peptides: List[str], lengths: List[int]) -> tuple:
+        """Return the cached prediction records for an allele and the peptides that still need a request."""
+        import pandas as pd
+        
+        records = []
+        missing = []
+        with self._cache_lock:
+            for peptide in peptides:
+                cached = [self._prediction_cache.get(self._cache_key(peptide, allele, length)) for length in lengths]
+                if any(rows is None for rows in cached):
+                    missing.append(peptide)
+                    continue
+                for rows in cached:
+                    # Cache files written by older versions hold DataFrames
+                    records.extend(rows.to_dict('records') if isinstance(rows, pd.DataFrame) else rows)
+        
+        if len(missing) < len(peptides):
+            logger.info(f"Using cached predictions for {len(peptides) - len(missing)} peptides with {allele}")
+        return records, missing
+    
+    @staticmethod
+    def _repeat_duplicates(df: pd.DataFrame, requested: List[str], occurrences: Counter) -> pd.DataFrame:
+        """Repeat each row of a deduplicated request once per occurrence of its input peptide."""
+        import pandas as pd
+        
+        if 'seq_num' not in df.columns:
+            return df
+        
+        counts = np.array([occurrences[peptide] for peptide in requested])
+        seq_index = pd.to_numeric(df['seq_num'], errors='coerce').fillna(1).astype(int).to_numpy() - 1
+        repeats = counts[np.clip(seq_index, 0, len(counts) - 1)]
+        return df.loc[df.index.repeat(repeats)].reset_index(drop=True)
+    
+    def close(self):
+        """Close the HTTP session and flush the persistent prediction cache, if any."""
+        self._session.close()
+        if hasattr(self._prediction_cache, 'close'):
+            self._prediction_cache.close()
+    
+    def predict_comprehensive(self, peptides: List[str], alleles: List[str], lengths: List[int] = None,
+                              delay: float = 2.0, max_workers: int = 4) -> pd.DataFrame:
+        """
+        Make comprehensive predictions using both EL and BA methods.
+        
+        Alleles that need the same peptides share one EL and one BA request. Alleles
+        the combined request does not return are retried one at a time, concurrently
+        by up to `max_workers` threads. Request starts are always spaced by `delay`
+        seconds across all threads. Repeated peptides are sent once and their rows
+        repeated in the result.
+        """
+        import pandas as pd
+        
         if lengths is None:
             lengths = [9]
         
@@ -248,73 +659,42 @@ class IEDBBindingPredictor:
         if isinstance(lengths, int):
             lengths = [lengths]
         
-        all_results = []
-        
         logger.info(f"Processing {len(alleles)} alleles with {delay}s delay between requests...")
         
-        # Process each allele separately to avoid API limits
-        for i, allele in enumerate(alleles):
-            logger.info(f"Processing allele {i+1}/{len(alleles)}: {allele}")
-            
-            # Add delay between requests (except for the first one)
-            if i > 0:
-                logger.info(f"Waiting {delay} seconds before next request...")
-                time.sleep(delay)
-            
-            allele_results = []
+        # Repeated peptides are requested once; their rows are repeated per occurrence afterwards
+        occurrences = Counter(peptides)
+        has_duplicates = len(occurrences) < len(peptides)
+        
+        # Serve cached predictions and group alleles by the peptides they still need
+        frames_by_allele: Dict[str, List[pd.DataFrame]] = {}
+        pending: Dict[tuple, List[str]] = {}
+        for allele in dict.fromkeys(alleles):
+            cached, missing = self._lookup_predictions(allele, peptides, lengths)
+            frames_by_allele[allele] = [pd.DataFrame(cached)] if cached else []
+            if missing:
+                pending.setdefault(tuple(dict.fromkeys(missing)), []).append(allele)
+        
+        for missing, group in pending.items():
+            missing = list(missing)
+            fresh = self._predict_alleles_batched(group, missing, lengths, delay) if len(group) > 1 else {}
             
-            # Get EL predictions for this allele
-            logger.info(f"Getting EL predictions for {allele}...")
-            el_results = self._make_api_request("netmhcpan_el", peptides, [allele], lengths)
+            # Single alleles, and any the combined request did not return, go one at a time
+            retry = [allele for allele in group if allele not in fresh]
+            if retry:
+                workers = max(1, min(max_workers, len(retry)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    fresh.update(zip(retry, executor.map(
+                        lambda allele: self._predict_allele(allele, missing, lengths, delay), retry
+                    )))
             
-            if not el_results.empty:
-                # Check if required columns exist
-                if 'peptide' not in el_results.columns or 'allele' not in el_results.columns:
-                    logger.warning(f"Missing required columns in EL results for {allele}. Available columns: {list(el_results.columns)}")
-                    continue
-                
-                # Select relevant columns from EL results
-                available_cols = ['allele', 'peptide', 'percentile_rank']
-                if 'el_score' in el_results.columns:
-                    available_cols.append('el_score')
-                elif 'score' in el_results.columns:
-                    available_cols.append('score')
-                    el_results = el_results.rename(columns={'score': 'el_score'})
-                    available_cols[-1] = 'el_score'
-                
-                el_data = el_results[[col for col in available_cols if col in el_results.columns]].copy()
-                el_data['method'] = 'netmhcpan_el'
-                
-                # Add delay before BA request
-                logger.info(f"Waiting {delay} seconds before BA request...")
-                time.sleep(delay)
-                
-                # Get BA predictions for this allele
-                logger.info(f"Getting BA predictions for {allele}...")
-                ba_results = self._make_api_request("netmhcpan_ba", peptides, [allele], lengths)
-                
-                if not ba_results.empty:
-                    # Check if required columns exist
-                    if 'peptide' in ba_results.columns and 'allele' in ba_results.columns:
-                        # Select relevant columns from BA results
-                        ba_cols = ['allele', 'peptide']
-                        if 'ic50' in ba_results.columns:
-                            ba_cols.append('ic50')
-                        
-                        ba_data = ba_results[[col for col in ba_cols if col in ba_results.columns]].copy()
-                        
-                        # Merge BA results with EL results
-                        if 'ic50' in ba_data.columns:
-                            el_data = el_data.merge(
-                                ba_data[['allele', 'peptide', 'ic50']], 
-                                on=['allele', 'peptide'], 
-                                how='left'
-                            )
-                
-                all_results.append(el_data)
-                logger.info(f"Completed predictions for {allele}: {len(el_data)} results")
-            else:
-                logger.warning(f"No EL results obtained for allele {allele}")
+            for allele, df in fresh.items():
+                if df is not None:
+                    self._store_predictions(allele, missing, lengths, df)
+                    if has_duplicates:
+                        df = self._repeat_duplicates(df, missing, occurrences)
+                    frames_by_allele[allele].append(df)
+        
+        all_results = [df for frames in frames_by_allele.values() for df in frames if not df.empty]
         
         # Combine all results
         if all_results:
@@ -332,9 +712,9 @@ class IEDBBindingPredictor:
         # Add immunogenicity scores
         logger.info("Calculating immunogenicity scores...")
         try:
-            combined_df['immunogenicity'] = combined_df.apply(
-                lambda row: self.calculate_immunogenicity_score(row['peptide'], row['allele']), 
-                axis=1
+            combined_df['immunogenicity'] = self.calculate_immunogenicity_scores(
+                combined_df['peptide'].astype(str).tolist(),
+                combined_df['allele'].astype(str).tolist()
             )
         except Exception as e:
             logger.error(f"Error calculating immunogenicity scores: {str(e)}")
@@ -361,7 +741,8 @@ class IEDBBindingPredictor:
         final_columns = [col for col in ['peptide', 'allele', 'el_score', 'percentile_rank', 'ic50', 'immunogenicity'] 
                         if col in df.columns]
         
-        return df[final_columns]
+        # Few distinct alleles repeat across every peptide, so store them as category codes
+        return df[final_columns].astype({'allele': 'category'})
     
     def save_to_csv(self, df: pd.DataFrame, file_path: str):
         """Save DataFrame to CSV with configured separators."""
@@ -370,81 +751,268 @@ class IEDBBindingPredictor:
             return
             
         try:
-            df.to_csv(file_path, 
-                     sep=self.csv_separator, 
-                     decimal=self.decimal_separator, 
-                     index=False)
+            # Pre-format each column, then let the C csv writer join the rows; columns
+            # of other types fall back to pandas' own (per-cell) formatter
+            columns = []
+            for i in range(df.shape[1]):
+                cells = self._format_csv_column(df.iloc[:, i], self.decimal_separator)
+                if cells is None:
+                    df.to_csv(file_path, 
+                             sep=self.csv_separator, 
+                             decimal=self.decimal_separator, 
+                             index=False)
+                    break
+                columns.append(cells)
+            else:
+                with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f, delimiter=self.csv_separator, lineterminator=os.linesep)
+                    writer.writerow(df.columns)
+                    writer.writerows(zip(*columns))
             logger.info(f"Saved {len(df)} results to {file_path}")
         except Exception as e:
             logger.error(f"Error saving to CSV: {str(e)}")
     
+    @staticmethod
+    def _format_csv_column(series: pd.Series, decimal: str) -> Optional[List]:
+        """Return a column's cells as DataFrame.to_csv would write them, or None for unsupported dtypes."""
+        import pandas as pd
+        
+        dtype = series.dtype
+        if dtype == np.float64:
+            # repr is the same shortest round-trip text pandas writes, without its per-cell overhead
+            values = series.to_numpy()
+            cells = list(map(repr, values.tolist()))
+            for i in np.flatnonzero(np.isnan(values)).tolist():
+                cells[i] = ''
+            if decimal != '.':
+                cells = '\n'.join(cells).replace('.', decimal).split('\n')
+            return cells
+        
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+        if pd.api.types.is_string_dtype(dtype) or pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            return series.astype(object).where(series.notna(), '').tolist()
+        return None
+    
+    def save_to_parquet(self, df: pd.DataFrame, file_path: str):
+        """Save DataFrame to a zstd-compressed Parquet file (requires pyarrow)."""
+        if df.empty:
+            logger.warning(f"Empty DataFrame, not saving to {file_path}")
+            return
+        
+        try:
+            df.to_parquet(file_path, compression="zstd", index=False)
+            logger.info(f"Saved {len(df)} results to {file_path}")
+        except Exception as e:
+            logger.error(f"Error saving to Parquet: {str(e)}")
+    
+    def save_results(self, df: pd.DataFrame, file_path: str):
+        """Save results as Parquet for a .parquet path, otherwise as CSV."""
+        if file_path.endswith(PARQUET_SUFFIX):
+            self.save_to_parquet(df, file_path)
+        else:
+            self.save_to_csv(df, file_path)
+    
     def filter_binders(self, df: pd.DataFrame, 
                       el_score_threshold: float = None,
                       percentile_threshold: float = None,
                       ic50_threshold: float = None,
                       immunogenicity_threshold: float = None) -> pd.DataFrame:
         """Filter binders based on multiple criteria."""
+        import pandas as pd
+        
         if df.empty:
             return df
         
-        # Convert numeric columns
-        numeric_cols = ['el_score', 'percentile_rank', 'ic50', 'immunogenicity']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Convert only the numeric columns that were not parsed as numbers
+        numeric_cols = [col for col in ['el_score', 'percentile_rank', 'ic50', 'immunogenicity']
+                        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col])]
+        if numeric_cols:
+            df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
         
-        # Apply filters
-        mask = pd.Series([True] * len(df))
+        # Active thresholds as (column, threshold, comparison)
+        thresholds = [
+            (col, threshold, compare)
+            for col, threshold, compare in [
+                ('el_score', el_score_threshold, np.greater_equal),
+                ('percentile_rank', percentile_threshold, np.less_equal),
+                ('ic50', ic50_threshold, np.less_equal),
+                ('immunogenicity', immunogenicity_threshold, np.greater_equal)
+            ]
+            if threshold is not None and col in df.columns
+        ]
         
-        if el_score_threshold is not None and 'el_score' in df.columns:
-            mask &= (df['el_score'] >= el_score_threshold)
-            
-        if percentile_threshold is not None and 'percentile_rank' in df.columns:
-            mask &= (df['percentile_rank'] <= percentile_threshold)
-            
-        if ic50_threshold is not None and 'ic50' in df.columns:
-            mask &= (df['ic50'] <= ic50_threshold)
-            
-        if immunogenicity_threshold is not None and 'immunogenicity' in df.columns:
-            mask &= (df['immunogenicity'] >= immunogenicity_threshold)
+        # Combine all thresholds into a single boolean mask, comparing into one reused buffer
+        mask = np.ones(len(df), dtype=bool)
+        passed = np.empty(len(df), dtype=bool)
+        for col, threshold, compare in thresholds:
+            compare(df[col].to_numpy(dtype=np.float64), threshold, out=passed)
+            mask &= passed
         
-        filtered_df = df[mask].copy()
+        filtered_df = df.loc[mask]
         logger.info(f"Filtered {len(df)} results to {len(filtered_df)} binders")
         
         return filtered_df
     
     def generate_variants(self, pattern: str) -> List[str]:
         """Generate peptide variants from a pattern like A[CD]E[FY]GH."""
-        variants = []
-        
-        def expand_pattern(current: str, remaining: str):
-            if not remaining:
-                variants.append(current)
-                return
-            
-            if remaining[0] == '[':
-                # Find closing bracket
-                close_idx = remaining.find(']')
-                if close_idx == -1:
-                    # Invalid pattern, treat as literal
-                    expand_pattern(current + remaining[0], remaining[1:])
-                    return
-                
-                # Extract options
-                options = remaining[1:close_idx]
-                for option in options:
-                    expand_pattern(current + option, remaining[close_idx+1:])
+        variants = list(self.iter_variants(pattern))
+        logger.info(f"Generated {len(variants)} variants from pattern: {pattern}")
+        return variants
+    
+    @staticmethod
+    def _tokenize_pattern(pattern: str) -> Optional[List[str]]:
+        """Split a pattern into the residues allowed at each position, or None if a group is empty."""
+        # Each token holds the residues allowed at one position; an unclosed
+        # bracket is kept as a literal character
+        tokens = []
+        i = 0
+        while i < len(pattern):
+            close_idx = pattern.find(']', i + 1) if pattern[i] == '[' else -1
+            if close_idx == -1:
+                tokens.append(pattern[i])
+                i += 1
             else:
-                # Regular character
-                expand_pattern(current + remaining[0], remaining[1:])
+                tokens.append(pattern[i + 1:close_idx])
+                i = close_idx + 1
+        
+        return tokens if all(tokens) else None
+    
+    @staticmethod
+    def iter_variants(pattern: str) -> Iterator[str]:
+        """Lazily yield the variants of a pattern, so huge patterns need not fit in memory."""
+        tokens = IEDBBindingPredictor._tokenize_pattern(pattern)
+        if tokens is None:
+            return iter([pattern])  # Fallback to original pattern
+        return map(''.join, product(*tokens))
+    
+    @staticmethod
+    def count_variants(pattern: str) -> int:
+        """Number of variants a pattern expands to, as an exact Python int."""
+        tokens = IEDBBindingPredictor._tokenize_pattern(pattern)
+        if tokens is None:
+            tokens = list(pattern)  # Fallback to original pattern
+        return math.prod(len(token) for token in tokens)
+    
+    @staticmethod
+    def iter_variant_blocks(pattern: str, block_size: int = VARIANT_BLOCK_SIZE) -> Iterator[np.ndarray]:
+        """
+        Yield the variants of an ASCII pattern as (n, length) uint8 arrays, in iter_variants order.
         
-        expand_pattern("", pattern)
+        Each block is filled column by column from a mixed-radix counter over the
+        variant indices, so no per-variant Python string is created.
+        """
+        tokens = IEDBBindingPredictor._tokenize_pattern(pattern)
+        if tokens is None:
+            tokens = list(pattern)  # Fallback to original pattern
         
-        if not variants:
-            variants = [pattern]  # Fallback to original pattern
+        choices = [np.frombuffer(token.encode('ascii'), dtype=np.uint8) for token in tokens]
+        total = IEDBBindingPredictor.count_variants(pattern)
+        if total > MAX_INDEXED_VARIANTS:
+            raise ValueError(f"Pattern has too many variants to index: {total}")
+        radices = np.array([len(c) for c in choices], dtype=np.int64)
         
-        logger.info(f"Generated {len(variants)} variants from pattern: {pattern}")
-        return variants
+        # The last position varies fastest, as in itertools.product
+        strides = np.ones(len(choices), dtype=np.int64)
+        strides[:-1] = np.cumprod(radices[:0:-1])[::-1]
+        template = np.array([c[0] for c in choices], dtype=np.uint8)
+        variable = [j for j, c in enumerate(choices) if len(c) > 1]
+        
+        for start in range(0, total, block_size):
+            index = np.arange(start, min(start + block_size, total), dtype=np.int64)
+            block = np.empty((len(index), len(choices)), dtype=np.uint8)
+            block[:] = template
+            for j in variable:
+                block[:, j] = choices[j][(index // strides[j]) % radices[j]]
+            yield block
+
+
+def format_fasta(peptides: List[str]) -> str:
+    """Format peptides as FASTA records named peptide1..N, joined in a single pass."""
+    parts = [None] * (2 * len(peptides))
+    parts[0::2] = [f">peptide{i}" for i in range(1, len(peptides) + 1)]
+    parts[1::2] = peptides
+    return "\n".join(parts)
+
+
+def parse_csv_list(value: str) -> List[str]:
+    """Split a comma-separated option into stripped, non-empty, unique items in their original order."""
+    if ',' not in value:
+        # Single value (the common single-allele case): nothing to split or dedupe
+        value = value.strip()
+        return [value] if value else []
+    return list(dict.fromkeys(item for item in map(str.strip, value.split(',')) if item))
+
+
+def load_peptide_chunks(value: str, chunk_size: int = PEPTIDE_CHUNK_SIZE) -> Iterator[List[str]]:
+    """Return the peptides of a --peptides value in chunks, from a file path or an inline comma-separated list."""
+    # Paths are single-line and shorter than PATH_MAX, so long inline lists skip the stat call
+    if len(value) < MAX_PATH_LENGTH and '\n' not in value and os.path.exists(value):
+        return iter_peptide_chunks(value, chunk_size)
+    return iter_chunks((item for item in map(str.strip, value.split(',')) if item), chunk_size)
+
+
+def write_variants(pattern: str, stream) -> int:
+    """Write the variants of a pattern to a binary stream, newline-separated, and return their count."""
+    count = 0
+    if not pattern.isascii() or IEDBBindingPredictor.count_variants(pattern) > MAX_INDEXED_VARIANTS:
+        # Byte blocks need one byte per residue and int64 variant indices; anything else
+        # goes through UTF-8 strings
+        for chunk in iter_chunks(IEDBBindingPredictor.iter_variants(pattern), VARIANT_BLOCK_SIZE):
+            stream.write(("\n" if count else "").encode() + "\n".join(chunk).encode("utf-8"))
+            count += len(chunk)
+        return count
+    
+    for block in IEDBBindingPredictor.iter_variant_blocks(pattern):
+        lines = np.empty((len(block), block.shape[1] + 1), dtype=np.uint8)
+        lines[:, 0] = ord("\n")
+        lines[:, 1:] = block
+        # No separator before the first variant
+        stream.write(lines.ravel()[0 if count else 1:])
+        count += len(block)
+    return count
+
+
+def iter_chunks(items: Iterable[str], chunk_size: int = PEPTIDE_CHUNK_SIZE) -> Iterator[List[str]]:
+    """Group any iterable of peptides into lists of at most `chunk_size`, consuming it lazily."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_peptide_blocks(path: str, block_size: int = FILE_BLOCK_SIZE) -> Iterator[List[str]]:
+    """Yield the stripped, non-empty lines of a peptide file as one list per block read through mmap."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            tail = b''
+            for start in range(0, len(mm), block_size):
+                block = tail + mm[start:start + block_size]
+                # Split only complete lines; the partial last line is carried into the next block
+                cut = block.rfind(b'\n') + 1
+                tail = block[cut:]
+                yield [line for line in map(str.strip, block[:cut].decode('utf-8').split('\n')) if line]
+            last = tail.decode('utf-8').strip()
+            if last:
+                yield [last]
+
+
+def iter_peptide_chunks(path: str, chunk_size: int = PEPTIDE_CHUNK_SIZE) -> Iterator[List[str]]:
+    """Yield the peptides of a file in chunks of at most `chunk_size`."""
+    pending = []
+    for peptides in iter_peptide_blocks(path):
+        pending.extend(peptides)
+        full = len(pending) - len(pending) % chunk_size
+        for i in range(0, full, chunk_size):
+            yield pending[i:i + chunk_size]
+        del pending[:full]
+    if pending:
+        yield pending
+
 
 # CLI Interface
 @click.group(epilog=textwrap.dedent('''\
@@ -465,6 +1033,12 @@ class IEDBBindingPredictor:
         Filtro con soglie multiple:
         python mhci_predictor.py filter --input risultati.csv --percentile 2.0 --ic50 500 --immunogenicity 0.5
     
+      PARQUET:
+        Con estensione .parquet in --output/--input i risultati sono scritti e letti
+        in formato Parquet compresso (richiede pyarrow):
+        python mhci_predictor.py predict --peptides peptide_list.txt --alleles "HLA-A*02:01" --output risultati.parquet
+        python mhci_predictor.py filter --input risultati.parquet --ic50 500
+    
       VARIANTI:
         Generazione varianti con salvataggio su file:
         python mhci_predictor.py variants "A[CD]E[FY]GH" --output varianti.txt
@@ -473,51 +1047,82 @@ class IEDBBindingPredictor:
       --output-dir:  Directory di output (default: ./output)
       --csv-sep:     Separatore colonne CSV (default: ',')
       --decimal-sep: Separatore decimali (default: '.')
+      --cache:       File cache delle predizioni riutilizzato tra esecuzioni (default: nessuno)
+      --no-response-cache: Disattiva la cache delle risposte API in <output-dir>/.iedb_cache
 '''))
 @click.option('--output-dir', default='./output', help='Output directory')
 @click.option('--csv-sep', default=',', help='CSV separator')
 @click.option('--decimal-sep', default='.', help='Decimal separator')
+@click.option('--cache', 'cache_file', default=None, help='Prediction cache file reused across runs')
+@click.option('--no-response-cache', 'response_cache', is_flag=True, flag_value=False, default=True,
+              help='Always query the API instead of reusing cached responses')
 @click.pass_context
-def main(ctx, output_dir, csv_sep, decimal_sep):
+def main(ctx, output_dir, csv_sep, decimal_sep, cache_file, response_cache):
     """Optimized MHC-I Binding Prediction Tool"""
     ctx.ensure_object(dict)
+    
+    # Variant generation is plain string expansion and needs no predictor
+    if ctx.invoked_subcommand == 'variants':
+        return
+    
     ctx.obj['predictor'] = IEDBBindingPredictor(
         output_dir=output_dir,
         csv_separator=csv_sep,
-        decimal_separator=decimal_sep
+        decimal_separator=decimal_sep,
+        cache_file=cache_file,
+        response_cache=response_cache
     )
+    ctx.call_on_close(ctx.obj['predictor'].close)
 
 @main.command()
 @click.option('--peptides', required=True, help='''Percorso a file o lista di peptidi separati da virgola
               (formato file: un peptide per riga)''')
 @click.option('--alleles', required=True, help='Lista di alleli MHC separati da virgola')
 @click.option('--lengths', default='9', help='Lunghezze peptidi separate da virgola (default: 9)')
-@click.option('--output', help='Percorso file output CSV')
+@click.option('--output', help='Percorso file output CSV (o Parquet con estensione .parquet)')
 @click.option('--delay', default=2.0, type=float, help='Delay tra richieste API in secondi (default: 2.0)')
+@click.option('--workers', default=4, type=click.IntRange(min=1),
+              help='Alleli elaborati in parallelo (default: 4)')
+@click.option('--chunk-size', default=PEPTIDE_CHUNK_SIZE, type=click.IntRange(min=1),
+              help=f'Peptidi inviati per richiesta API (default: {PEPTIDE_CHUNK_SIZE})')
 @click.pass_context
-def predict(ctx, peptides, alleles, lengths, output, delay):
+def predict(ctx, peptides, alleles, lengths, output, delay, workers, chunk_size):
     """Esegue predizioni di binding complete
     (metodi EL + BA + calcolo immunogenicita')
     """
+    import pandas as pd
+    
     predictor = ctx.obj['predictor']
     
-    # Parse peptides
-    if os.path.exists(peptides):
-        with open(peptides, 'r') as f:
-            peptides_list = [line.strip() for line in f if line.strip()]
-    else:
-        peptides_list = [p.strip() for p in peptides.split(',')]
+    # Parse peptides (files are streamed in chunks)
+    peptide_chunks = load_peptide_chunks(peptides, chunk_size)
     
     # Parse alleles and lengths
-    alleles_list = [a.strip() for a in alleles.split(',')]
+    alleles_list = parse_csv_list(alleles)
     lengths_list = [int(l.strip()) for l in lengths.split(',')]
     
-    # Run predictions
-    results = predictor.predict_comprehensive(peptides_list, alleles_list, lengths_list, delay=delay)
+    # Run predictions, sending each distinct peptide once across all chunks
+    seen = set()
+    total = 0
+    frames = []
+    for chunk in peptide_chunks:
+        total += len(chunk)
+        chunk = [p for p in dict.fromkeys(chunk) if p not in seen]
+        seen.update(chunk)
+        if chunk:
+            frames.append(predictor.predict_comprehensive(chunk, alleles_list, lengths_list, delay=delay,
+                                                          max_workers=workers))
+    
+    if not seen:
+        raise click.UsageError("Nessun peptide da analizzare in --peptides")
+    if total > len(seen):
+        click.echo(f"{total - len(seen)} duplicate peptides removed")
+    
+    results = pd.concat(frames, ignore_index=True)
     
     # Save results
     if output:
-        predictor.save_to_csv(results, output)
+        predictor.save_results(results, output)
     else:
         output_file = os.path.join(predictor.output_dir, "prediction_results.csv")
         predictor.save_to_csv(results, output_file)
@@ -528,28 +1133,37 @@ def predict(ctx, peptides, alleles, lengths, output, delay):
 @click.option('--pattern', required=True, help='Sequence pattern (e.g., A[CD]E[FY]GH)')
 @click.option('--alleles', required=True, help='MHC alleles (comma-separated)')
 @click.option('--lengths', default='9', help='Peptide lengths (comma-separated)')
-@click.option('--output', required=True, help='Output CSV file')
+@click.option('--output', required=True, help='Output CSV file (Parquet for a .parquet path)')
 @click.option('--delay', default=2.0, type=float, help='Delay between API requests (seconds)')
+@click.option('--workers', default=4, type=click.IntRange(min=1), help='Alleles predicted in parallel')
+@click.option('--chunk-size', default=PEPTIDE_CHUNK_SIZE, type=click.IntRange(min=1),
+              help='Variants sent per API request')
 @click.pass_context
-def analyze(ctx, pattern, alleles, lengths, output, delay):
+def analyze(ctx, pattern, alleles, lengths, output, delay, workers, chunk_size):
     """Analyze peptide pattern variants"""
+    import pandas as pd
+    
     predictor = ctx.obj['predictor']
     
-    # Generate variants
-    peptides_list = predictor.generate_variants(pattern)
-    alleles_list = [a.strip() for a in alleles.split(',')]
+    alleles_list = parse_csv_list(alleles)
     lengths_list = [int(l.strip()) for l in lengths.split(',')]
     
+    # Stream the variants to the predictor in chunks instead of listing every combination
+    variant_chunks = iter_chunks(predictor.iter_variants(pattern), chunk_size)
+    
     # Run predictions
-    results = predictor.predict_comprehensive(peptides_list, alleles_list, lengths_list, delay=delay)
+    frames = [predictor.predict_comprehensive(chunk, alleles_list, lengths_list, delay=delay,
+                                            max_workers=workers)
+              for chunk in variant_chunks]
+    results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
     
     # Save results
-    predictor.save_to_csv(results, output)
+    predictor.save_results(results, output)
     click.echo(f"✅ Pattern analysis completed. {len(results)} results saved to {output}")
 
 @main.command()
-@click.option('--input', required=True, help='File CSV di input con risultati predizioni')
-@click.option('--output', help='File output per risultati filtrati')
+@click.option('--input', required=True, help='File CSV (o .parquet) di input con risultati predizioni')
+@click.option('--output', help='File output per risultati filtrati (CSV o .parquet)')
 @click.option('--el-score', type=float, help='Soglia minima EL score')
 @click.option('--percentile', type=float, help='Soglia massima percentile rank')
 @click.option('--ic50', type=float, help='Soglia massima IC50 (nM)')
@@ -559,26 +1173,51 @@ def filter(ctx, input, output, el_score, percentile, ic50, immunogenicity):
     """Filtra risultati in base a soglie specificate
     (almeno una soglia deve essere fornita)
     """
+    import pandas as pd
+    
     predictor = ctx.obj['predictor']
     
-    # Load data
-    df = pd.read_csv(input, sep=predictor.csv_separator, decimal=predictor.decimal_separator)
+    thresholds = {
+        'el_score_threshold': el_score,
+        'percentile_threshold': percentile,
+        'ic50_threshold': ic50,
+        'immunogenicity_threshold': immunogenicity
+    }
     
-    # Apply filters
-    filtered = predictor.filter_binders(
-        df,
-        el_score_threshold=el_score,
-        percentile_threshold=percentile,
-        ic50_threshold=ic50,
-        immunogenicity_threshold=immunogenicity
-    )
+    # Load data and apply filters
+    if input.endswith(PARQUET_SUFFIX):
+        # Let the Parquet reader skip row groups that cannot pass the thresholds
+        filters = [
+            (col, op, threshold)
+            for col, op, threshold in [
+                ('el_score', '>=', el_score),
+                ('percentile_rank', '<=', percentile),
+                ('ic50', '<=', ic50),
+                ('immunogenicity', '>=', immunogenicity)
+            ]
+            if threshold is not None
+        ]
+        df = pd.read_parquet(input, filters=filters or None)
+        filtered = predictor.filter_binders(df, **thresholds)
+    elif HAS_PYARROW:
+        # The multithreaded Arrow parser reads the whole file quickly
+        df = pd.read_csv(input, sep=predictor.csv_separator, decimal=predictor.decimal_separator, engine="pyarrow")
+        filtered = predictor.filter_binders(df, **thresholds)
+    else:
+        # Filter while reading, so only the surviving rows of each chunk are kept
+        with pd.read_csv(input, sep=predictor.csv_separator, decimal=predictor.decimal_separator,
+                         engine="c", memory_map=True, chunksize=FILTER_CHUNK_SIZE) as reader:
+            chunks = [predictor.filter_binders(chunk, **thresholds) for chunk in reader]
+        filtered = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
     
     # Output results
     if output:
-        predictor.save_to_csv(filtered, output)
+        predictor.save_results(filtered, output)
         click.echo(f"✅ Filtered {len(filtered)} results saved to {output}")
     else:
-        click.echo(filtered.to_string(index=False))
+        # Stream rows as CSV with the C writer instead of formatting one big table string
+        filtered.to_csv(click.get_text_stream('stdout'), sep=predictor.csv_separator,
+                        decimal=predictor.decimal_separator, index=False)
 
 @main.command()
 @click.argument('pattern')
@@ -588,16 +1227,16 @@ def variants(pattern, output):
     Pattern: sequenza con gruppi opzionali in parentesi quadre
     Esempio: "A[CD]E[FY]GH" genera ACEFGH, ACEYGH, ADFGH, ADYGH
     """
-    predictor = IEDBBindingPredictor()
-    variants_list = predictor.generate_variants(pattern)
-    
+    # Pattern expansion needs no predictor state (output dir, HTTP session, caches)
     if output:
-        with open(output, 'w') as f:
-            f.write('\n'.join(variants_list))
-        click.echo(f"✅ Generated {len(variants_list)} variants saved to {output}")
+        with open(output, 'wb') as f:
+            count = write_variants(pattern, f)
+        click.echo(f"✅ Generated {count} variants saved to {output}")
     else:
-        for variant in variants_list:
-            click.echo(variant)
+        stdout = sys.stdout.buffer
+        write_variants(pattern, stdout)
+        stdout.write(b"\n")
+        stdout.flush()
 
 if __name__ == '__main__':
     main()